@@ -0,0 +1,260 @@
+"""
+Runs scripted scenarios headlessly and reports ms per frame split into
+input, update, collision and render, plus the peak traced memory.
+
+    python benchmark.py --frames 300 --out benchmark.json
+    python benchmark.py --only bots-40 long-snakes
+"""
+
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List
+import pygame
+from fruit import FruitsSpawner
+from globals import *
+from headless import NODES_TYPES, init_headless, setup_match
+from pyengine import *
+from scene_manager import Gameplay, SceneManager, SceneType
+from snake import Snake, SnakeCollisionManager
+from utils import wrap
+
+PHASES = ("input", "update", "collision", "render")
+
+
+@dataclass
+class Scenario:
+    name: str
+    scene_type: SceneType = SceneType.GAMEPLAY
+    bots: int = 10
+    players: int = 0
+    nodes: int = 0  # force every snake to this many nodes, 0 keeps the default
+    fruits: int = 0
+    cut_skins: bool = False
+    buttons: int = 0
+
+
+SCENARIOS = [
+    Scenario("bots-10"),
+    Scenario("bots-40", bots=40),
+    Scenario("long-snakes", nodes=300),
+    Scenario("fruits", fruits=300),
+    Scenario("cut-skins", bots=20, nodes=60, cut_skins=True),
+    Scenario("menu-buttons", SceneType.MAIN_MENU, bots=1, players=1, buttons=500),
+]
+
+
+@dataclass
+class Result:
+    name: str
+    frames: int
+    ms_per_frame: Dict[str, float] = field(default_factory=dict)
+    max_frame_ms: float = 0
+    peak_memory_kb: float = 0
+    entities: int = 0
+
+
+class PhaseTimer:
+    """
+    Charges wall time to exclusive phases by wrapping methods in place,
+    a nested phase (collision inside update) pauses the outer one
+    """
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.stack: List[str] = []
+        self.last = 0.0
+        self.patched = []
+
+    def switch(self, now: float):
+        if self.stack:
+            self.totals[self.stack[-1]] += now - self.last
+        self.last = now
+
+    def wrap(self, owner: type, name: str, phase: str):
+        func = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            self.switch(time.perf_counter())
+            self.stack.append(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.switch(time.perf_counter())
+                self.stack.pop()
+
+        self.patched.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, timed)
+
+    def __enter__(self):
+        self.wrap(GameManager, "update", "update")
+        self.wrap(InputManager, "update", "input")
+        self.wrap(ColliderManager, "update", "collision")
+        self.wrap(SnakeCollisionManager, "check_collisions", "collision")
+        self.wrap(Snake, "check_collisions", "collision")
+        self.wrap(Snake, "check_fruit_collision", "collision")
+        self.wrap(RenderManager, "render", "render")
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, func in reversed(self.patched):
+            setattr(owner, name, func)
+        self.patched.clear()
+
+
+def load_scene(scene_type: SceneType):
+    # kill the previous scene first, Gameplay numbers its snakes from
+    # Snake.snake_count, which only its kill() resets
+    GameManager().dt = 0
+    GameManager().clear_scene(exceptions={FruitsSpawner(), SnakeCollisionManager()})
+    GameManager().update()
+    # drop the GameOver that killing Gameplay opens
+    InputManager().clear()
+    GameManager().to_add.clear()
+    SnakeCollisionManager().reset()
+    Snake.snake_count = 0
+
+    SceneManager().set_scene(scene_type)
+    GameManager().update()
+
+
+def serpentine(head: Pos, count: int) -> List[Pos]:
+    """
+    count positions DIST_BETWEEN_NODES apart, folded into rows
+    so that a long body fits on screen
+    """
+    per_row = int(W / 2 / Snake.DIST_BETWEEN_NODES)
+    row_gap = Snake.DIST_BETWEEN_NODES * 1.5
+    positions = []
+    for k in range(count):
+        row, col = divmod(k, per_row)
+        if row % 2:
+            col = per_row - 1 - col
+        positions.append(
+            wrap(head + Pos(col * Snake.DIST_BETWEEN_NODES, row * row_gap))
+        )
+    return positions
+
+
+def prepare(scenario: Scenario):
+    load_scene(scenario.scene_type)
+    snakes = SnakeCollisionManager().snakes
+    if scenario.nodes:
+        for snake in snakes:
+            snake.nodes = Snake.NODES_TYPE(serpentine(snake.nodes[0], scenario.nodes))
+            snake.transform.pos = snake.nodes[0]
+            snake.speed = snake.calc_speed()
+    if scenario.cut_skins:
+        for attacker, attacked in zip(snakes, snakes[1:] + snakes[:1]):
+            if len(attacked.nodes) > 2:
+                SnakeCollisionManager().on_collision(
+                    attacker, attacked, len(attacked.nodes) // 2
+                )
+    for _ in range(scenario.fruits):
+        FruitsSpawner().spawn(Pos(random.randint(0, W), random.randint(0, H)))
+    for k in range(scenario.buttons):
+        button = UiButton()
+        button.transform.size = Size(30, 10)
+        button.transform.pos = Pos(k % 20 * 32, k // 20 * 12 % H)
+        GameManager().instatiate(button)
+    for entity in GameManager().entities:
+        if isinstance(entity, Gameplay):
+            entity.countdown = -1  # skip the countdown, unpauses on the next frame
+    GameManager().update()
+
+
+def run_frames(sur: Surface, frames: int, dt: float) -> List[float]:
+    """
+    returns the wall time of every frame
+    """
+    frame_times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        GameManager().dt = dt
+        GameManager().update()
+        RenderManager().render(sur)
+        frame_times.append(time.perf_counter() - start)
+    return frame_times
+
+
+def run_scenario(scenario: Scenario, frames: int, warmup: int, dt: float, seed: int):
+    sur = Surface((W, H))
+    random.seed(seed)
+    prepare(scenario)
+    run_frames(sur, warmup, dt)
+
+    result = Result(scenario.name, frames, entities=len(GameManager().entities))
+    with PhaseTimer() as timer:
+        frame_times = run_frames(sur, frames, dt)
+    result.ms_per_frame = {
+        phase: timer.totals[phase] * 1000 / frames for phase in PHASES
+    }
+    result.ms_per_frame["total"] = sum(frame_times) * 1000 / frames
+    result.max_frame_ms = max(frame_times) * 1000
+
+    # a second run for memory, tracemalloc would skew the timings above
+    random.seed(seed)
+    prepare(scenario)
+    tracemalloc.start()
+    run_frames(sur, frames, dt)
+    result.peak_memory_kb = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return result
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--dt", type=float, default=1 / 60, help="fixed frame time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--nodes", choices=NODES_TYPES, default="chain")
+    parser.add_argument("--only", nargs="*", choices=[s.name for s in SCENARIOS])
+    parser.add_argument("--out", default="benchmark.json")
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args()
+    init_headless()
+    Snake.NODES_TYPE = NODES_TYPES[args.nodes]
+    scenarios = [s for s in SCENARIOS if not args.only or s.name in args.only]
+    setup_match(max(s.bots + s.players for s in scenarios), 0, args.seed, secs=10**9)
+
+    results = []
+    print(f"{'scenario':<14}" + "".join(f"{p:>11}" for p in PHASES + ("total",)))
+    for scenario in scenarios:
+        settings.bots_count = scenario.bots
+        settings.players_count = scenario.players
+        result = run_scenario(scenario, args.frames, args.warmup, args.dt, args.seed)
+        results.append(result)
+        print(
+            f"{result.name:<14}"
+            + "".join(f"{ms:>11.3f}" for ms in result.ms_per_frame.values())
+            + f"   peak {result.peak_memory_kb:.0f} KiB"
+        )
+
+    with open(args.out, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "pygame": pygame.version.ver,
+                "platform": platform.platform(),
+                "nodes": args.nodes,
+                "frames": args.frames,
+                "dt": args.dt,
+                "seed": args.seed,
+                "scenarios": [asdict(r) for r in results],
+            },
+            f,
+            indent=2,
+        )
+
+
+if __name__ == "__main__":
+    main()
+    pygame.quit()
@@ -55,6 +55,18 @@ class Fruit(Entity):
     def render(self, sur):
         pygame.draw.circle(sur, self.color, self.transform.pos, Fruit.R)
 
+    def snapshot(self):
+        return self.transform.pos.copy(), Color(self.color)
+
+    def render_snapshot(self, sur, data):
+        pos, color = data
+        pygame.draw.circle(sur, color, pos, Fruit.R)
+
+    def render_bounds(self):
+        rect = Rect(0, 0, Fruit.R * 2 + 2, Fruit.R * 2 + 2)
+        rect.center = self.transform.pos
+        return (rect,)
+
 
 class SpeedFruit(Fruit):
     MULTIPLIER = 1.5
@@ -82,6 +94,20 @@ class SpeedFruit(Fruit):
         if not self.snake:
             super().render(sur)
 
+    def snapshot(self):
+        if not self.snake:
+            return super().snapshot()
+        return ()
+
+    def render_snapshot(self, sur, data):
+        if data:
+            super().render_snapshot(sur, data)
+
+    def render_bounds(self):
+        if not self.snake:
+            return super().render_bounds()
+        return ()
+
     def trigger_hit(self, snake):
         if self.snake:
             return
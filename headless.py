@@ -0,0 +1,108 @@
+"""
+Runs a Gameplay match without a window or audio, as fast as the CPU allows.
+Used to evaluate bots and to profile the simulation without rendering noise.
+
+    python headless.py --bots 10 --seed 1 --secs 60 --dt 0.016
+"""
+
+import argparse
+import os
+import random
+import time
+import pygame
+from globals import *
+from nodes import NodeArray, NodeChain, NodePath
+from pyengine import *
+from scene_manager import Gameplay, SceneManager, SceneType
+from snake import Snake, SnakeCollisionManager
+from utils import generate_color
+
+NODES_TYPES = {"chain": NodeChain, "array": NodeArray, "path": NodePath}
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bots", type=int, default=settings.bots_count)
+    parser.add_argument("--players", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--secs", type=float, default=Gameplay.GAME_OVER_TIME_SECS, help="match length"
+    )
+    parser.add_argument("--dt", type=float, default=1 / 60, help="fixed frame time")
+    parser.add_argument("--nodes", choices=NODES_TYPES, default="chain")
+    parser.add_argument(
+        "--trace", metavar="JSON", help="record a Chrome trace of the match"
+    )
+    return parser.parse_args(args)
+
+
+def init_headless():
+    """
+    Initializes pygame on SDL's dummy drivers, no window and no audio device
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.init()
+    pygame.mixer.init()
+    pygame.display.set_mode((W, H))
+
+
+def setup_match(bots_count: int, players_count: int, seed: int, secs: float):
+    assert bots_count + players_count > 0, "a match needs at least one snake"
+    settings.bots_count = bots_count
+    settings.players_count = players_count
+    settings.music = False
+    settings.sound_effects = False
+    random.seed(seed)
+    for _ in range(settings.snakes_count() - len(settings.colors)):
+        settings.colors.append(generate_color())
+    Gameplay.GAME_OVER_TIME_SECS = secs
+
+
+def run_match(dt: float) -> int:
+    """
+    Plays a Gameplay scene to its end with a fixed dt,
+    returns the number of simulated frames
+    """
+    SceneManager().set_scene(SceneType.GAMEPLAY)
+    frames = 0
+    while (
+        SceneManager().scene_type == SceneType.GAMEPLAY
+        and not GameManager().should_exit
+    ):
+        GameManager().dt = dt
+        GameManager().update()
+        frames += 1
+    return frames
+
+
+def main():
+    args = parse_args()
+    init_headless()
+    Snake.NODES_TYPE = NODES_TYPES[args.nodes]
+    setup_match(args.bots, args.players, args.seed, args.secs)
+
+    if args.trace:
+        Tracer().start(args.trace)
+    start = time.perf_counter()
+    frames = run_match(args.dt)
+    elapsed = time.perf_counter() - start
+    Tracer().stop()
+
+    print(
+        f"{frames} frames in {elapsed:.2f}s "
+        f"({frames / elapsed:.0f} fps, {elapsed / frames * 1000:.2f} ms/frame)"
+    )
+    for snake in sorted(
+        SnakeCollisionManager().snakes,
+        key=lambda s: s.info_display.score.score,
+        reverse=True,
+    ):
+        is_bot = snake.id < settings.bots_count
+        name = f"{'Bot' if is_bot else 'Player'} {snake.id}:"
+        print(f"{name:<10}{snake.info_display.score.score:<5}{len(snake.nodes)} nodes")
+
+
+if __name__ == "__main__":
+    main()
+    pygame.quit()
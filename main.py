@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import pygame
 from pyengine import *
@@ -5,23 +6,114 @@ from scene_manager import SceneManager, SceneType
 from globals import *
 
 
-async def main():
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="simulate the next frame on a worker thread while drawing this one",
+    )
+    parser.add_argument(
+        "--dirty-rects",
+        action="store_true",
+        help="redraw and present only the regions that changed, "
+        "ignored with --pipelined and --debug",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="draw the debug overlay with per-manager and per-type timings",
+    )
+    parser.add_argument(
+        "--trace", metavar="JSON", help="record a Chrome trace of the session"
+    )
+    parser.add_argument(
+        "--telemetry",
+        metavar="JSONL",
+        help="append frame time percentiles per scene, e.g. to telemetry.jsonl",
+    )
+    parser.add_argument(
+        "--profile-key",
+        action="store_true",
+        help="toggle a cProfile capture with F9 (Profiler.KEY)",
+    )
+    parser.add_argument(
+        "--profile-scene",
+        nargs="*",
+        default=[],
+        choices=[scene_type.name for scene_type in SceneType],
+        help="capture a cProfile of every scene of these types",
+    )
+    parser.add_argument(
+        "--leaks",
+        action="store_true",
+        help="report memory growth and live entities on every scene change",
+    )
+    args = parser.parse_known_args()[0]
+    if args.pipelined and (args.profile_key or args.profile_scene):
+        parser.error("the profiler only runs without --pipelined")
+    return args
+
+
+async def main(debug=False, dirty_rects=False):
     pygame.init()
     pygame.mixer.init()
 
     pygame.display.set_caption("Sneaky Loop! by: achiyazigi")
     screen = pygame.display.set_mode((W, H))
     SceneManager().set_scene(SceneType.MAIN_MENU)
-    # UpdateManager().start_fixed_update_loop()
     while not GameManager().should_exit:
-        screen.fill(BG)
         GameManager().update()
-        GameManager().render(screen)
-        # GameManager().render_debug(screen)
-        pygame.display.flip()
+        if dirty_rects and not debug:
+            pygame.display.update(GameManager().render_dirty(screen, BG))
+        else:
+            screen.fill(BG)
+            if debug:
+                GameManager().render_debug(screen)
+            else:
+                GameManager().render(screen)
+            pygame.display.flip()
         await asyncio.sleep(0)
-    # UpdateManager().stop_fixed_update_loop()
 
 
-asyncio.run(main())
+def main_pipelined():
+    pygame.init()
+    pygame.mixer.init()
+
+    pygame.display.set_caption("Sneaky Loop! by: achiyazigi")
+    screen = pygame.display.set_mode((W, H))
+    SceneManager().set_scene(SceneType.MAIN_MENU)
+    sim = SimulationThread()
+    frame: Frame = ()
+    try:
+        while not GameManager().should_exit:
+            sim.step(pygame.event.get())
+            screen.fill(BG)
+            RenderManager().render_snapshot(screen, frame)
+            pygame.display.flip()
+            frame = sim.join()
+            GameManager().tick()
+    finally:
+        sim.stop()
+
+
+args = parse_args()
+FrameStats.enabled = args.debug
+if args.trace:
+    Tracer().start(args.trace)
+if args.telemetry:
+    Telemetry().start(args.telemetry)
+Profiler.hotkey = args.profile_key
+Profiler.auto_scenes = set(args.profile_scene)
+if args.leaks:
+    LeakDetector().start()
+try:
+    if args.pipelined:
+        main_pipelined()
+    else:
+        asyncio.run(main(args.debug, args.dirty_rects))
+finally:
+    SceneManager().flush_telemetry()
+    Profiler().on_scene_change("exit")
+    Tracer().stop()
 pygame.quit()
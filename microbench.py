@@ -0,0 +1,196 @@
+"""
+Times the hot small paths in isolation and compares them against a baseline.
+
+    python microbench.py --save baseline.json
+    python microbench.py --compare baseline.json --threshold 0.15
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from typing import Callable, Dict, Tuple
+import pygame
+from benchmark import serpentine
+from globals import *
+from headless import NODES_TYPES, init_headless
+from pyengine import *
+from snake import Snake, SnakeCollisionManager
+from utils import shortest_vector, wrap, wrap_ip
+
+ENTITIES = 500
+CALLBACKS = 50
+NODES = 200
+
+# name -> (setup, case), setup returns the case's state and a teardown
+Bench = Tuple[Callable[[], Tuple[object, Callable[[], None]]], Callable[[object], None]]
+BENCHES: Dict[str, Bench] = {}
+
+
+def bench(name: str, setup: Callable = lambda: (None, lambda: None)):
+    def decorator(case):
+        BENCHES[name] = (setup, case)
+        return case
+
+    return decorator
+
+
+def sorted_entities():
+    entities = [EmptyEntity() for _ in range(ENTITIES)]
+    for k, entity in enumerate(entities):
+        entity.z_index = k % 10
+        RenderManager().register(entity)
+    target = entities[-1]
+
+    def teardown():
+        for entity in entities:
+            RenderManager().unregister(entity)
+
+    return target, teardown
+
+
+def key_callbacks():
+    entities = [EmptyEntity() for _ in range(CALLBACKS)]
+    for entity in entities:
+        GameManager().entities.add(entity)
+        InputManager().register_key_down(K_SPACE, entity, lambda: False)
+
+    def teardown():
+        InputManager().clear()
+        GameManager().entities.difference_update(entities)
+
+    return InputManager().callbacks_key_down, teardown
+
+
+def long_snake():
+    snake = Snake(Pos(W / 2, H / 2), SnakeKeys(None, None, None))
+    snake.nodes = Snake.NODES_TYPE(serpentine(snake.nodes[0], NODES))
+    snake.transform.pos = snake.nodes[0]
+
+    def teardown():
+        InputManager().clear()
+        GameManager().to_add.clear()
+        SnakeCollisionManager().reset()
+        Snake.snake_count = 0
+
+    return snake, teardown
+
+
+@bench("utils.shortest_vector")
+def bench_shortest_vector(_):
+    shortest_vector(Pos(630, 10), Pos(5, 500))
+
+
+@bench("utils.wrap")
+def bench_wrap(_):
+    wrap(Pos(-3, 700))
+
+
+@bench("utils.wrap_ip")
+def bench_wrap_ip(_):
+    wrap_ip(Pos(-3, 700))
+
+
+@bench("LayeredQueue.remove+add", sorted_entities)
+def bench_layered_queue(target):
+    entities = RenderManager().entityes_sorted
+    entities.remove(target)
+    entities.add(target)
+
+
+@bench("RenderManager.register+unregister", sorted_entities)
+def bench_render_register(target):
+    RenderManager().unregister(target)
+    RenderManager().register(target)
+
+
+@bench("InputManager._trigger_key", key_callbacks)
+def bench_trigger_key(callbacks):
+    InputManager._trigger_key(callbacks, K_SPACE)
+
+
+@bench("Snake.nodes.follow", long_snake)
+def bench_follow(snake: Snake):
+    snake.dir.rotate_ip(3)
+    head = snake.nodes[0] + snake.dir * 2
+    wrap_ip(head)
+    snake.nodes.follow(head, Snake.DIST_BETWEEN_NODES)
+
+
+@bench("Snake.check_collisions", long_snake)
+def bench_self_collision(snake: Snake):
+    snake.check_collisions()
+
+
+def run(number: int, repeat: int) -> Dict[str, float]:
+    """
+    returns the best ns per call of every bench
+    """
+    results = {}
+    for name, (setup, case) in BENCHES.items():
+        state, teardown = setup()
+        try:
+            best = min(timeit.repeat(lambda: case(state), number=number, repeat=repeat))
+        finally:
+            teardown()
+        results[name] = best / number * 1e9
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float):
+    """
+    prints every bench against the baseline,
+    returns False if any got slower by more than threshold
+    """
+    ok = True
+    for name, ns in results.items():
+        if name not in baseline:
+            print(f"{name:<36}{ns:>12.0f} ns  (new)")
+            continue
+        change = ns / baseline[name] - 1
+        regressed = change > threshold
+        ok &= not regressed
+        mark = "  REGRESSION" if regressed else ""
+        print(f"{name:<36}{ns:>12.0f} ns  {change:+7.1%}{mark}")
+    return ok
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=2000, help="calls per repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--nodes", choices=NODES_TYPES, default="chain")
+    parser.add_argument("--save", metavar="JSON", help="write results as a baseline")
+    parser.add_argument("--compare", metavar="JSON", help="baseline to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="allowed slowdown before failing, 0.1 is 10%%",
+    )
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args()
+    init_headless()
+    Snake.NODES_TYPE = NODES_TYPES[args.nodes]
+    results = run(args.number, args.repeat)
+
+    ok = True
+    if args.compare:
+        with open(args.compare) as f:
+            ok = compare(results, json.load(f), args.threshold)
+    else:
+        for name, ns in results.items():
+            print(f"{name:<36}{ns:>12.0f} ns")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    return ok
+
+
+if __name__ == "__main__":
+    ok = main()
+    pygame.quit()
+    sys.exit(0 if ok else 1)
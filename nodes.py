@@ -0,0 +1,628 @@
+from collections import deque
+from itertools import chain, islice
+from math import hypot
+from typing import Iterable
+from pygame import Vector2
+
+from globals import H, W
+from pyengine import Pos, SpatialHash
+from utils import shortest_vector, wrap, wrap_ip
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only NodeArray needs it
+    np = None
+
+
+class NodeChain:
+    """
+    Default snake body container, head first.
+    Nodes are kept in a deque of short segments (deques of Vector2),
+    so growing the head is O(1) and splitting, concatenating and
+    deleting a range only touch whole segments plus a single
+    partial one, instead of copying every node.
+    """
+
+    SEGMENT_LEN = 64
+
+    def __init__(self, nodes: Iterable[Pos] = ()):
+        self._segments: deque[deque[Pos]] = deque()
+        self._len = 0
+        for node in nodes:
+            if (
+                not self._segments
+                or len(self._segments[-1]) >= NodeChain.SEGMENT_LEN
+            ):
+                self._segments.append(deque())
+            self._segments[-1].append(node)
+            self._len += 1
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._segments)
+
+    def _locate(self, i: int) -> tuple[int, int]:
+        """
+        returns (segment index, offset in segment) of node i
+        """
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("node index out of range")
+        for seg_idx, segment in enumerate(self._segments):
+            if i < len(segment):
+                return seg_idx, i
+            i -= len(segment)
+
+    def __getitem__(self, i: int) -> Pos:
+        if i == 0:
+            return self._segments[0][0]
+        if i == -1:
+            return self._segments[-1][-1]
+        seg_idx, offset = self._locate(i)
+        return self._segments[seg_idx][offset]
+
+    def push_front(self, pos: Pos):
+        if not self._segments or len(self._segments[0]) >= NodeChain.SEGMENT_LEN:
+            self._segments.appendleft(deque())
+        self._segments[0].appendleft(pos)
+        self._len += 1
+
+    def split(self, idx: int) -> "NodeChain":
+        """
+        Keeps nodes[:idx] and returns nodes[idx:] as a new chain
+        """
+        tail = NodeChain()
+        if idx >= self._len:
+            return tail
+        seg_idx, offset = self._locate(idx)
+        for _ in range(len(self._segments) - seg_idx - 1):
+            tail._segments.appendleft(self._segments.pop())
+        segment = self._segments[-1]
+        if offset == 0:
+            tail._segments.appendleft(self._segments.pop())
+        else:
+            moved = deque()
+            for _ in range(len(segment) - offset):
+                moved.appendleft(segment.pop())
+            tail._segments.appendleft(moved)
+        tail._len = sum(len(segment) for segment in tail._segments)
+        self._len -= tail._len
+        return tail
+
+    def concat(self, other: "NodeChain"):
+        """
+        Appends other's nodes after the tail, other is left empty
+        """
+        self._segments.extend(other._segments)
+        self._len += other._len
+        other._segments = deque()
+        other._len = 0
+        self._compact()
+
+    def delete_range(self, first: int, last: int):
+        """
+        Same as del nodes[first:last]
+        """
+        tail = self.split(last)
+        self.split(first)
+        self.concat(tail)
+
+    def _compact(self):
+        # cuts and rejoins leave partial segments behind,
+        # regroup once they outnumber full ones
+        if len(self._segments) > 2 * self._len // NodeChain.SEGMENT_LEN + 2:
+            nodes = list(self)
+            self.__init__(nodes)
+
+    def follow(self, head: Pos, dist: float):
+        """
+        Moves the first node to head and drags every other node
+        towards the one in front of it, keeping them dist apart
+        """
+        prev = head
+        nodes = iter(self)
+        next(nodes)
+        for curr in nodes:
+            direction = shortest_vector(curr, prev).normalize()
+            curr.update(prev - direction * dist)
+            wrap_ip(curr)
+            prev = curr
+        self._segments[0][0] = head
+
+    def points(self, first: int = 0, last: int = None) -> list[Pos]:
+        """
+        nodes[first:last], to read and not to keep:
+        these are the live nodes, the next follow() moves them
+        """
+        last = self._len if last is None else min(last, self._len)
+        if first >= last:
+            return []
+        seg_idx, offset = self._locate(first)
+        nodes = chain.from_iterable(islice(self._segments, seg_idx, None))
+        return list(islice(nodes, offset, offset + last - first))
+
+    def slide_back(self, step: Vector2) -> list[Pos]:
+        """
+        The nodes with the head moved back by step, and every other
+        node slid as far back towards the node behind it
+        """
+        nodes = list(self)
+        moved = step.length()
+        res = [wrap(nodes[0] - step)]
+        for k in range(1, len(nodes)):
+            if k + 1 < len(nodes):
+                behind = shortest_vector(nodes[k], nodes[k + 1])
+            else:
+                behind = shortest_vector(nodes[k - 1], nodes[k])
+            if behind:
+                behind.scale_to_length(moved)
+            res.append(wrap(nodes[k] + behind))
+        return res
+
+
+class NodeArray:
+    """
+    Structure of arrays snake body container, head first.
+    x and y live in contiguous float64 arrays with spare room
+    at the front, so growing the head is amortized O(1) and
+    splitting, concatenating and deleting a range are array copies.
+
+    It pays off on long bodies: the per-frame readers, points()
+    and slide_back(), work on the arrays instead of a Vector2 per node.
+
+    Indexing returns a Vector2 copy, so write back with
+    nodes[i] = pos instead of mutating the result in place.
+    """
+
+    DTYPE = "float64"  # the precision of Vector2, so bodies match NodeChain
+    MIN_CAPACITY = 16
+    VECTORIZE_FROM = 24  # shorter bodies are faster node by node than numpy calls
+
+    def __init__(self, nodes: Iterable[Pos] = ()):
+        assert np is not None, "NodeArray requires numpy"
+        nodes = list(nodes)
+        self._alloc(len(nodes))
+        for i, node in enumerate(nodes):
+            self._x[self._start + i] = node[0]
+            self._y[self._start + i] = node[1]
+
+    @classmethod
+    def from_arrays(cls, x, y) -> "NodeArray":
+        res = cls()
+        res._alloc(len(x))
+        res.x[:] = x
+        res.y[:] = y
+        return res
+
+    def _alloc(self, size: int, front_room: int = None):
+        if front_room is None:
+            capacity = max(NodeArray.MIN_CAPACITY, size * 2)
+            front_room = (capacity - size) // 2
+        else:
+            capacity = max(NodeArray.MIN_CAPACITY, size * 2, front_room + size)
+        self._x = np.empty(capacity, NodeArray.DTYPE)
+        self._y = np.empty(capacity, NodeArray.DTYPE)
+        self._start = front_room
+        self._end = front_room + size
+
+    @property
+    def x(self):
+        return self._x[self._start : self._end]
+
+    @property
+    def y(self):
+        return self._y[self._start : self._end]
+
+    def __len__(self):
+        return self._end - self._start
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("node index out of range")
+        return self._start + i
+
+    def __getitem__(self, key: int) -> Pos:
+        i = self._index(key)
+        return Vector2(self._x.item(i), self._y.item(i))
+
+    def __setitem__(self, key: int, pos: Pos):
+        i = self._index(key)
+        self._x[i] = pos[0]
+        self._y[i] = pos[1]
+
+    def __iter__(self):
+        for x, y in zip(self.x.tolist(), self.y.tolist()):
+            yield Vector2(x, y)
+
+    def push_front(self, pos: Pos):
+        if self._start == 0:
+            x, y = self.x, self.y
+            size = len(self) + 1
+            # grow with room at the front, where snakes grow
+            self._alloc(size, max(NodeArray.MIN_CAPACITY, size) - 1)
+            self.x[1:] = x
+            self.y[1:] = y
+        else:
+            self._start -= 1
+        self[0] = pos
+
+    def split(self, idx: int) -> "NodeArray":
+        tail = NodeArray.from_arrays(self.x[idx:], self.y[idx:])
+        self._end = self._start + min(idx, len(self))
+        return tail
+
+    def concat(self, other: "NodeArray"):
+        x = np.concatenate((self.x, other.x))
+        y = np.concatenate((self.y, other.y))
+        self._alloc(len(x))
+        self.x[:] = x
+        self.y[:] = y
+        other._alloc(0)
+
+    def delete_range(self, first: int, last: int):
+        # shift the shorter side over the hole
+        if first < len(self) - last:
+            self.x[last - first : last] = self.x[:first].copy()
+            self.y[last - first : last] = self.y[:first].copy()
+            self._start += last - first
+        else:
+            self.x[first : len(self) - (last - first)] = self.x[last:].copy()
+            self.y[first : len(self) - (last - first)] = self.y[last:].copy()
+            self._end -= last - first
+
+    def follow(self, head: Pos, dist: float):
+        """
+        Same motion as NodeChain.follow(). Every node follows the
+        already moved node in front of it, so the body is walked node
+        by node on plain floats, and wrapped once at the end
+        """
+        x, y = self.x, self.y
+        xs = x.tolist()
+        ys = y.tolist()
+        prev_x, prev_y = head[0], head[1]
+        for i in range(1, len(xs)):
+            dx = _shortest(xs[i], prev_x, W)
+            dy = _shortest(ys[i], prev_y, H)
+            length = hypot(dx, dy)
+            if length:
+                prev_x -= dx / length * dist
+                prev_y -= dy / length * dist
+            xs[i] = prev_x
+            ys[i] = prev_y
+        xs[0] = head[0]
+        ys[0] = head[1]
+        if len(xs) < NodeArray.VECTORIZE_FROM:
+            x[:] = [v % W for v in xs]
+            y[:] = [v % H for v in ys]
+        else:
+            np.mod(xs, W, out=x)
+            np.mod(ys, H, out=y)
+
+    def points(self, first: int = 0, last: int = None) -> list[tuple[float, float]]:
+        """
+        nodes[first:last] as (x, y) tuples
+        """
+        return list(zip(self.x[first:last].tolist(), self.y[first:last].tolist()))
+
+    def slide_back(self, step: Vector2) -> list[tuple[float, float]]:
+        """
+        Same as NodeChain.slide_back(), on the whole arrays at once,
+        or node by node on plain floats for short bodies
+        """
+        if len(self) < NodeArray.VECTORIZE_FROM:
+            return self._slide_back_nodes(step)
+        x, y = self.x, self.y
+        head_x = (x[:1] - step[0]) % W
+        head_y = (y[:1] - step[1]) % H
+        if len(x) == 1:
+            return list(zip(head_x.tolist(), head_y.tolist()))
+        # towards the next node, the tail away from the one before it
+        behind_x = _shortest(x[:-1], x[1:], W)
+        behind_y = _shortest(y[:-1], y[1:], H)
+        behind_x = np.append(behind_x[1:], behind_x[-1])
+        behind_y = np.append(behind_y[1:], behind_y[-1])
+        length = np.hypot(behind_x, behind_y)
+        scale = np.divide(
+            step.length(), length, out=np.zeros_like(length), where=length > 0
+        )
+        xs = np.concatenate((head_x, (x[1:] + behind_x * scale) % W))
+        ys = np.concatenate((head_y, (y[1:] + behind_y * scale) % H))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def _slide_back_nodes(self, step: Vector2) -> list[tuple[float, float]]:
+        xs = self.x.tolist()
+        ys = self.y.tolist()
+        moved = step.length()
+        res = [((xs[0] - step[0]) % W, (ys[0] - step[1]) % H)]
+        for k in range(1, len(xs)):
+            a, b = (k, k + 1) if k + 1 < len(xs) else (k - 1, k)
+            dx = _shortest(xs[a], xs[b], W)
+            dy = _shortest(ys[a], ys[b], H)
+            length = hypot(dx, dy)
+            if length:
+                dx *= moved / length
+                dy *= moved / length
+            res.append(((xs[k] + dx) % W, (ys[k] + dy) % H))
+        return res
+
+
+class NodePath:
+    """
+    Path history snake body model, head first.
+    Instead of storing the nodes, the head's trajectory is kept
+    in a ring buffer and the nodes are sampled along it every
+    spacing units of arc length. Advancing the head costs
+    amortized O(1), and the node list is only built (and cached)
+    once someone reads the nodes (see materialize()).
+
+    Splitting only trims the path. Concatenating and deleting
+    a range rebuild it from the current nodes, they only happen
+    on rejoins and loops.
+
+    Opt in with Snake.NODES_TYPE. follow() alone is far cheaper
+    than NodeChain's (microbench.py, 200 nodes: 3.3 us against
+    0.64 ms), but the snake reads every node each step anyway
+    (self-collision, rendering), so the whole path still gets
+    sampled in Python and a frame comes out slower overall
+    (headless.py --bots 20 --seed 3: 4.84 against 3.72 ms/frame).
+    """
+
+    SPACING = 10  # Snake.DIST_BETWEEN_NODES, updated by follow()
+    RECORD_STEP_RATIO = 0.25  # head moves shorter than this get merged
+
+    def __init__(self, nodes: Iterable[Pos] = (), spacing: float = None):
+        self.spacing = spacing if spacing else NodePath.SPACING
+        self._rebuild(list(nodes))
+
+    def _rebuild(self, nodes: list[Pos]):
+        self.count = len(nodes)
+        self._points: deque[tuple[float, float]] = deque(
+            (node[0], node[1]) for node in nodes
+        )
+        self._seg_lengths: deque[float] = deque(
+            _shortest_length(a, b) for a, b in zip(self._points, nodes[1:])
+        )
+        self._total = sum(self._seg_lengths)
+        missing = (self.count - 1) * self.spacing - self._total
+        if missing > 0 and len(self._points) > 1:
+            # nodes closer than spacing (e.g. around a cut) would leave the
+            # tail stacked on the last point, extend the path beyond it
+            a, b = self._points[-2], self._points[-1]
+            dx = _shortest(a[0], b[0], W)
+            dy = _shortest(a[1], b[1], H)
+            length = self._seg_lengths[-1] or 1
+            self._points[-1] = (
+                (b[0] + dx / length * missing) % W,
+                (b[1] + dy / length * missing) % H,
+            )
+            self._seg_lengths[-1] += missing
+            self._total += missing
+        self._moved = 0  # last head move, kept past the tail for slide_back()
+        self._nodes: list[Pos] = None
+
+    def _push_front(self, pos: Pos):
+        head = (pos[0] % W, pos[1] % H)
+        if self._points:
+            length = _shortest_length(head, self._points[0])
+            self._seg_lengths.appendleft(length)
+            self._total += length
+        self._points.appendleft(head)
+        self._nodes = None
+
+    def _trim(self):
+        needed = (self.count - 1) * self.spacing + self._moved
+        while (
+            len(self._seg_lengths) > 1
+            and self._total - self._seg_lengths[-1] >= needed
+        ):
+            self._total -= self._seg_lengths.pop()
+            self._points.pop()
+
+    def follow(self, head: Pos, dist: float):
+        """
+        Moves the head and records its trajectory, the body
+        is sampled along it next time the nodes are read
+        """
+        self.spacing = dist
+        self._moved = _shortest_length(self._points[0], head) if self._points else 0
+        if (
+            len(self._seg_lengths) > 1
+            and self._seg_lengths[0] < dist * NodePath.RECORD_STEP_RATIO
+        ):
+            # the head did not move far enough from the last recorded
+            # point yet, move it instead of recording a new one
+            self._total -= self._seg_lengths.popleft()
+            self._points.popleft()
+        self._push_front(head)
+        self._trim()
+
+    def materialize(self) -> list[Pos]:
+        if self._nodes is None:
+            self._nodes = self._sample()
+        return self._nodes
+
+    def points(self, first: int = 0, last: int = None) -> list[Pos]:
+        return self.materialize()[first:last]
+
+    def slide_back(self, step: Vector2) -> list[Pos]:
+        """
+        The nodes sampled step's length further down the path,
+        as if the head had not moved that far yet
+        """
+        return self._sample(step.length())
+
+    def _sample(self, offset: float = 0) -> list[Pos]:
+        nodes = []
+        if not self._points:
+            return nodes
+        target = offset
+        walked = 0  # arc length from the head to a
+        a = self._points[0]
+        for length, b in zip(self._seg_lengths, islice(self._points, 1, None)):
+            dx = _shortest(a[0], b[0], W)
+            dy = _shortest(a[1], b[1], H)
+            while target <= walked + length and len(nodes) < self.count:
+                t = (target - walked) / length if length else 0
+                nodes.append(Vector2((a[0] + dx * t) % W, (a[1] + dy * t) % H))
+                target += self.spacing
+            if len(nodes) == self.count:
+                return nodes
+            walked += length
+            a = b
+        while len(nodes) < self.count:
+            nodes.append(Vector2(a))
+        return nodes
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i: int) -> Pos:
+        if i == 0 and self._points:
+            return Vector2(self._points[0])
+        return Vector2(self.materialize()[i])
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def push_front(self, pos: Pos):
+        self._push_front(pos)
+        self.count += 1
+
+    def split(self, idx: int) -> "NodePath":
+        tail = NodePath(self.materialize()[idx:], self.spacing)
+        self.count = min(idx, self.count)
+        self._nodes = None
+        self._trim()
+        return tail
+
+    def concat(self, other: "NodePath"):
+        self._rebuild(self.materialize() + other.materialize())
+        other._rebuild([])
+
+    def delete_range(self, first: int, last: int):
+        nodes = self.materialize()
+        del nodes[first:last]
+        self._rebuild(nodes)
+
+
+Nodes = NodeChain | NodeArray | NodePath
+
+
+class BodyBounds:
+    """
+    Bounding circles over consecutive chunks of a snake body, plus
+    one circle around the whole body, so collision checks can skip
+    whole chunks or whole snakes with a single test.
+
+    Nodes never move farther than the head did, so instead of
+    refitting every frame the circles are inflated by the distance
+    the head moved, and only refitted once that slack grows past
+    REFIT_SLACK or the node count changed (growth, cut, loop, rejoin).
+    Distances wrap at the screen edges like shortest_vector().
+    """
+
+    CHUNK_LEN = 16
+    REFIT_SLACK = 10
+
+    def __init__(self):
+        self.chunks: list[tuple[float, float, float]] = []  # (x, y, r)
+        self.root: tuple[float, float, float] = None  # None: can't reject
+        self.count = -1
+        self.slack = 0
+
+    def inflate(self, moved: float):
+        self.slack += moved
+
+    def fit(self, nodes: Nodes):
+        if len(nodes) != self.count or self.slack > BodyBounds.REFIT_SLACK:
+            self.refit(nodes)
+
+    def refit(self, nodes: Nodes):
+        self.count = len(nodes)
+        self.slack = 0
+        self.chunks.clear()
+        anchor = None
+        offsets = []
+        for i, node in enumerate(nodes.points()):
+            if i % BodyBounds.CHUNK_LEN == 0:
+                if anchor:
+                    self.chunks.append(_bounding_circle(anchor, offsets))
+                anchor = (node[0], node[1])
+                offsets.clear()
+            offsets.append(
+                (_shortest(anchor[0], node[0], W), _shortest(anchor[1], node[1], H))
+            )
+        if anchor:
+            self.chunks.append(_bounding_circle(anchor, offsets))
+        self.root = None
+        if self.chunks:
+            anchor = self.chunks[0]
+            offsets = [
+                (_shortest(anchor[0], x, W), _shortest(anchor[1], y, H), r)
+                for x, y, r in self.chunks
+            ]
+            root = _bounding_circle(anchor, offsets)
+            # past half the screen the shortest way around is ambiguous
+            if root[2] < min(W, H) / 2:
+                self.root = root
+
+    def chunks_near(
+        self, circles: list[tuple[float, float, float]], grid: SpatialHash, skip=None
+    ) -> dict[int, list[int]]:
+        """
+        returns {chunk index: indices of the circles near it} for the
+        chunks that may have nodes inside one of the (x, y, r) circles,
+        chunk k holds the nodes [k * CHUNK_LEN, (k + 1) * CHUNK_LEN).
+        grid holds the circle indices inserted over their area,
+        circle skip is ignored
+        """
+        slack = self.slack
+        near = set()
+        for x, y, r in [self.root] if self.root else self.chunks:
+            r += slack
+            near.update(grid.query_overlap((x - r, y - r), (x + r, y + r)))
+        near.discard(skip)
+        near = [circles[j] + (j,) for j in near]
+        if self.root:
+            near = [c for c in near if _circle_near(self.root, c, c[2] + slack)]
+        chunks = {}
+        for k, chunk in enumerate(self.chunks):
+            hits = [c[3] for c in near if _circle_near(chunk, c, c[2] + slack)]
+            if hits:
+                chunks[k] = hits
+        return chunks
+
+
+def _bounding_circle(anchor, offsets) -> tuple[float, float, float]:
+    """
+    offsets are (dx, dy) or (dx, dy, r) relative to anchor
+    """
+    cx = sum(o[0] for o in offsets) / len(offsets)
+    cy = sum(o[1] for o in offsets) / len(offsets)
+    r = max(hypot(o[0] - cx, o[1] - cy) + (o[2] if len(o) > 2 else 0) for o in offsets)
+    return ((anchor[0] + cx) % W, (anchor[1] + cy) % H, r)
+
+
+def _circle_near(circle, pos: Pos, radius: float):
+    x, y, r = circle
+    dx = _shortest(x, pos[0], W)
+    dy = _shortest(y, pos[1], H)
+    return dx * dx + dy * dy < (r + radius) ** 2
+
+
+def _shortest_length(from_pos, to_pos):
+    return hypot(
+        _shortest(from_pos[0], to_pos[0], W), _shortest(from_pos[1], to_pos[1], H)
+    )
+
+
+def _shortest(from_coord, to_coord, size):
+    """
+    Per axis shortest_vector(), works on arrays and scalars
+    """
+    return (to_coord - from_coord + size / 2) % size - size / 2
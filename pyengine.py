@@ -1,14 +1,20 @@
+from collections import Counter, deque
+from itertools import count
+from operator import attrgetter, itemgetter
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass
 from enum import Enum
 from math import pi, sin
-from threading import Timer
 import pygame
 from pygame import Color, Rect, Vector2, Surface
 from abc import ABC, ABCMeta
+from array import array
+from time import perf_counter, strftime, time as wall_time
 from typing import (
     Callable,
+    Dict,
+    Iterable,
     List,
-    MutableSequence,
     Sequence,
     Set,
     Tuple,
@@ -16,6 +22,14 @@ from typing import (
     overload,
 )
 import bisect
+import cProfile
+import gc
+import json
+import os
+import pstats
+import queue
+import threading
+import tracemalloc
 
 
 class Singelton(ABCMeta):
@@ -168,6 +182,31 @@ class Entity(ABC):
         """
         pass
 
+    def snapshot(self):
+        """
+        An immutable copy of what render_snapshot() needs, taken right
+        after the update in pipelined mode. None (the default) means
+        render() is called on the live entity under GameManager().sim_lock
+        """
+        return None
+
+    def render_snapshot(self, sur: Surface, data):
+        """
+        Draws data from snapshot(), the simulation may already
+        be updating the next frame meanwhile
+        """
+        pass
+
+    def render_bounds(self) -> Union[Sequence[Rect], None]:
+        """
+        The screen regions render() draws to this frame, for the
+        dirty-rect mode. None means unknown and redraws the whole screen,
+        the default unless render() isn't overridden
+        """
+        if type(self).render is Entity.render:
+            return ()
+        return None
+
     def render_debug(self, sur: Surface):
         axis_length = 20
         pygame.draw.line(
@@ -194,6 +233,7 @@ class Entity(ABC):
         """
         UpdateManager().unregister(self)
         RenderManager().unregister(self)
+        InputManager().unregister(self)
         self.state = EntityState.Destroyed
 
     def set_parent(self, parent):
@@ -210,9 +250,9 @@ class Entity(ABC):
             RenderManager().unregister(self)
             self._z_index = z_index
             RenderManager().register(self)
-            InputManager().update_callbacks_order()
         else:
             self._z_index = z_index
+        InputManager().reorder(self)
 
     @property
     def update_order(self):
@@ -246,8 +286,17 @@ class CollideEntity(Entity):
     To register collision functions, return a
     list of CollisionData by overriding the
     method register_collision_functions().
+    Subclasses inherit them, as the entity and as the other.
+
+    Two entities collide only if each one's collision_mask has a bit
+    of the other's collision_layer. Both default to the class'
+    COLLISION_LAYER and COLLISION_MASK, type pairs the class values
+    rule out are dropped from the plan, so instances may only narrow them.
     """
 
+    COLLISION_LAYER = 1
+    COLLISION_MASK = ~0  # collides with every layer
+
     # Yuk!
     @classmethod
     def register_collision_functions(cls) -> list[CollisionData]:
@@ -255,102 +304,865 @@ class CollideEntity(Entity):
 
     def __init__(self):
         super().__init__()
+        self.collision_layer = type(self).COLLISION_LAYER
+        self.collision_mask = type(self).COLLISION_MASK
 
     def start(self):
         super().start()
         ColliderManager().register(self)
-        for collision_data in self.register_collision_functions():
-            ColliderManager().describe_collision(
-                type(self), collision_data.type_other, collision_data.collision_function
-            )
-
-        for base_type in type(self).mro()[1:]:
-            if base_type == CollideEntity:
-                break
-            collide_with_set = ColliderManager().graph.edges.get(base_type, {})
-            for collide_with in collide_with_set:
-                func = ColliderManager().collision_functions_dict[
-                    (base_type, collide_with)
-                ]
-                ColliderManager.describe_collision(type(self), collide_with, func)
 
     def kill(self):
         super().kill()
         ColliderManager().unregister(self)
 
 
-class _Utils:
-    def remove_from_sorted_list[T, K](
-        sorted_list: MutableSequence[T], item: T, *, key: Callable[[T], K] = None
+class LayeredQueue:
+    """
+    Entities bucketed by an integer layer (z_index, update_order).
+    Iterates layer by layer in ascending order and in insertion
+    order within a layer, like a stable sorted list, but add() and
+    remove() are O(1) unless they open or empty a layer.
+
+    Iteration goes over a flattened tuple cached until the next
+    change, so entities may come and go while it is iterated.
+    """
+
+    def __init__(self, layer_of: Callable[[Entity], int]):
+        self.layer_of = layer_of
+        self.buckets: dict[int, dict[Entity, None]] = {}
+        self.layers: list[int] = []  # the bucket keys, sorted
+        self.entity_layers: dict[Entity, int] = {}
+        self.flat: tuple[Entity, ...] = ()
+
+    def add(self, entity: Entity):
+        layer = self.layer_of(entity)
+        bucket = self.buckets.get(layer)
+        if bucket is None:
+            bucket = self.buckets[layer] = {}
+            bisect.insort(self.layers, layer)
+        bucket[entity] = None
+        self.entity_layers[entity] = layer
+        self.flat = None
+
+    def remove(self, entity: Entity) -> bool:
+        layer = self.entity_layers.pop(entity, None)
+        if layer is None:
+            return False
+        bucket = self.buckets[layer]
+        del bucket[entity]
+        if not bucket:
+            del self.buckets[layer]
+            self.layers.remove(layer)
+        self.flat = None
+        return True
+
+    def __iter__(self):
+        if self.flat is None:
+            self.flat = tuple(
+                entity for layer in self.layers for entity in self.buckets[layer]
+            )
+        return iter(self.flat)
+
+    def __len__(self):
+        return len(self.entity_layers)
+
+
+class SpatialHash:
+    """
+    Uniform grid bucketing items by position, used to find
+    items close to a point without scanning all of them.
+
+    If wrap_size is given the grid is toroidal: cell indices
+    wrap around the edges, so items on opposite edges of the
+    world are neighbours.
+    """
+
+    # with their mirrors and (0, 0) these make up a cell's neighbourhood
+    HALF_NEIGHBOURS = ((1, -1), (1, 0), (1, 1), (0, 1))
+
+    def __init__(self, cell_size: float, wrap_size: Size = None):
+        self.wrap_size = wrap_size
+        self.cell_w = self.cell_h = cell_size
+        self.cols = self.rows = None
+        if wrap_size:
+            # cells may only grow so that any two points closer
+            # than cell_size are always in adjacent cells
+            self.cols = max(1, int(wrap_size.w // cell_size))
+            self.rows = max(1, int(wrap_size.h // cell_size))
+            self.cell_w = wrap_size.w / self.cols
+            self.cell_h = wrap_size.h / self.rows
+        self.cells: dict[tuple[int, int], list] = {}
+
+    def cell_of(self, pos: Pos) -> tuple[int, int]:
+        cx = int(pos[0] // self.cell_w)
+        cy = int(pos[1] // self.cell_h)
+        if self.wrap_size:
+            return cx % self.cols, cy % self.rows
+        return cx, cy
+
+    def _cells_range(
+        self, low: float, high: float, cell: float, count: int, ring: int = 1
     ):
-        left = bisect.bisect_left(sorted_list, key(item) if key else item, key=key)
-        right = bisect.bisect_right(sorted_list, key(item) if key else item, key=key)
-        for i in range(left, right):
-            if sorted_list[i] is item:
-                sorted_list.pop(i)
-                return True
-        return False
+        first = int(low // cell) - ring
+        last = int(high // cell) + ring
+        if not self.wrap_size:
+            return range(first, last + 1)
+        if last - first + 1 >= count:
+            return range(count)
+        return [c % count for c in range(first, last + 1)]
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, pos: Pos, item):
+        cell = self.cell_of(pos)
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            self.cells[cell] = [item]
+        else:
+            bucket.append(item)
+
+    def insert_area(self, top_left: Pos, bottom_right: Pos, item):
+        """
+        Inserts item into every cell the area overlaps, so items of any
+        size are found by query_area() (once per cell they share with it)
+        """
+        xs = self._cells_range(top_left[0], bottom_right[0], self.cell_w, self.cols, 0)
+        ys = self._cells_range(top_left[1], bottom_right[1], self.cell_h, self.rows, 0)
+        for x in xs:
+            for y in ys:
+                bucket = self.cells.get((x, y))
+                if bucket is None:
+                    self.cells[(x, y)] = [item]
+                else:
+                    bucket.append(item)
+
+    def query_area(self, top_left: Pos, bottom_right: Pos):
+        """
+        Yields every item in the cells overlapping the area and their
+        neighbours, a superset of the items closer than cell_size to it
+        """
+        xs = self._cells_range(top_left[0], bottom_right[0], self.cell_w, self.cols)
+        ys = self._cells_range(top_left[1], bottom_right[1], self.cell_h, self.rows)
+        for x in xs:
+            for y in ys:
+                bucket = self.cells.get((x, y))
+                if bucket:
+                    yield from bucket
+
+    def query(self, pos: Pos):
+        return self.query_area(pos, pos)
+
+    def query_overlap(self, top_left: Pos, bottom_right: Pos):
+        """
+        Yields every item in the cells overlapping the area, enough to
+        find the items inserted with insert_area() that overlap it
+        """
+        xs = self._cells_range(top_left[0], bottom_right[0], self.cell_w, self.cols, 0)
+        ys = self._cells_range(top_left[1], bottom_right[1], self.cell_h, self.rows, 0)
+        for x in xs:
+            for y in ys:
+                bucket = self.cells.get((x, y))
+                if bucket:
+                    yield from bucket
+
+    def near_pairs(self):
+        """
+        Yields every pair of items sharing a cell or in adjacent cells,
+        a superset of the pairs closer than cell_size. Walks each cell
+        against half of its neighbours, so a pair comes once on grids
+        at least three cells wide
+        """
+        cells = self.cells
+        for (x, y), bucket in cells.items():
+            for k, item in enumerate(bucket):
+                for other in bucket[k + 1 :]:
+                    yield item, other
+            for dx, dy in SpatialHash.HALF_NEIGHBOURS:
+                cell = (x + dx, y + dy)
+                if self.wrap_size:
+                    cell = (cell[0] % self.cols, cell[1] % self.rows)
+                neighbour = cells.get(cell)
+                if neighbour:
+                    for item in bucket:
+                        for other in neighbour:
+                            yield item, other
+
+
+class FrameStats(metaclass=Singelton):
+    """
+    Opt-in profiler for the debug overlay. While FrameStats.enabled
+    the managers take an instrumented path that times their sections
+    and every entity by type, otherwise they don't touch this class.
+    Sections nest: fixed update includes colliders and snake collisions,
+    update includes the entities' own collision checks.
+    """
+
+    WINDOW = 120  # frames in the rolling averages and the graph
+    GRAPH_H = 50
+    GRAPH_MS = 50  # frame time at the top of the graph
+    TARGET_MS = 1000 / 60
+    TEXT_COLOR = Color("Grey")
+    GRAPH_COLOR = Color(90, 160, 90)
+    TARGET_COLOR = Color(160, 60, 60)
+    TOP_TYPES = 8
+    enabled = False
+
+    def __init__(self):
+        self.sections: Dict[str, float] = {}
+        self.types: Dict[Tuple[str, str], float] = {}
+        self.collision_tests = 0
+        self.history: deque[Tuple[Dict[str, float], Dict, int, float]] = deque(
+            maxlen=FrameStats.WINDOW
+        )
+        self.font = pygame.font.Font(size=16)
+
+    def add(self, section: str, secs: float):
+        self.sections[section] = self.sections.get(section, 0) + secs
+
+    def add_type(self, section: str, entity: "Entity", secs: float):
+        key = (section, type(entity).__name__)
+        self.types[key] = self.types.get(key, 0) + secs
+
+    def timed(self, section: str, func: Callable, *args):
+        start = perf_counter()
+        result = func(*args)
+        self.add(section, perf_counter() - start)
+        return result
+
+    def end_frame(self, frame_secs: float):
+        self.history.append(
+            (self.sections, self.types, self.collision_tests, frame_secs)
+        )
+        self.sections = {}
+        self.types = {}
+        self.collision_tests = 0
+
+    def averages(self) -> Tuple[Dict[str, float], Dict[str, float], float, float]:
+        """
+        Rolling (ms per section, ms per (section, type), collision tests,
+        ms per frame) over the last WINDOW frames
+        """
+        sections: Dict[str, float] = {}
+        types: Dict[Tuple[str, str], float] = {}
+        tests = frame = 0
+        for frame_sections, frame_types, frame_tests, frame_secs in self.history:
+            for section, secs in frame_sections.items():
+                sections[section] = sections.get(section, 0) + secs
+            for key, secs in frame_types.items():
+                types[key] = types.get(key, 0) + secs
+            tests += frame_tests
+            frame += frame_secs
+        n = max(len(self.history), 1)
+        return (
+            {section: secs * 1000 / n for section, secs in sections.items()},
+            {key: secs * 1000 / n for key, secs in types.items()},
+            tests / n,
+            frame * 1000 / n,
+        )
+
+    def render(self, sur: Surface, pos: Pos):
+        sections, types, tests, frame_ms = self.averages()
+        graph_w = FrameStats.WINDOW
+        scale = FrameStats.GRAPH_H / FrameStats.GRAPH_MS
+        bottom = pos.y + FrameStats.GRAPH_H
+        for x, (*_, frame_secs) in enumerate(self.history):
+            h = min(frame_secs * 1000 * scale, FrameStats.GRAPH_H)
+            pygame.draw.line(
+                sur,
+                FrameStats.GRAPH_COLOR,
+                (pos.x + x, bottom),
+                (pos.x + x, bottom - h),
+            )
+        target_y = bottom - FrameStats.TARGET_MS * scale
+        pygame.draw.line(
+            sur,
+            FrameStats.TARGET_COLOR,
+            (pos.x, target_y),
+            (pos.x + graph_w, target_y),
+        )
+
+        lines = [f"frame {frame_ms:6.2f} ms"]
+        lines += [f"{name:<16}{ms:6.2f} ms" for name, ms in sections.items()]
+        lines.append(f"collision tests {tests:.0f}")
+        by_type: Dict[str, Dict[str, float]] = {}
+        for (section, type_name), ms in types.items():
+            by_type.setdefault(type_name, {})[section] = ms
+        for type_name, ms in sorted(
+            by_type.items(), key=lambda item: sum(item[1].values()), reverse=True
+        )[: FrameStats.TOP_TYPES]:
+            lines.append(
+                f"{type_name[:16]:<16}"
+                f"f {ms.get('fixed update', 0):5.2f} "
+                f"u {ms.get('update', 0):5.2f} r {ms.get('render', 0):5.2f}"
+            )
+        y = bottom + 4
+        for line in lines:
+            text_sur = self.font.render(line, False, FrameStats.TEXT_COLOR)
+            sur.blit(text_sur, (pos.x, y))
+            y += text_sur.get_height()
+
+
+class Tracer(metaclass=Singelton):
+    """
+    Opt-in Chrome trace-event recorder (chrome://tracing, ui.perfetto.dev).
+    Spans are queued as they end and written by a background thread,
+    when the queue is full new spans are dropped rather than waiting.
+    While Tracer.enabled is False span() returns a shared no-op context
+    and the managers skip per-entity spans entirely.
+    """
+
+    BUFFER = 100_000
+    enabled = False
+    NULL_SPAN = nullcontext()
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue(Tracer.BUFFER)
+        self.writer: threading.Thread = None
+        self.origin = 0.0
+        self.dropped = 0
+
+    def start(self, path: str):
+        assert not Tracer.enabled, "already tracing"
+        self.origin = perf_counter()
+        self.dropped = 0
+        self.writer = threading.Thread(target=self.write, args=(path,), daemon=True)
+        self.writer.start()
+        Tracer.enabled = True
+
+    def stop(self):
+        if not Tracer.enabled:
+            return
+        Tracer.enabled = False
+        self.queue.put(None)
+        self.writer.join()
+        if self.dropped:
+            print(f"Tracer: dropped {self.dropped} spans, the buffer was full")
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            f.write("[\n")
+            json.dump(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "args": {"name": "SneakyLoop"},
+                },
+                f,
+            )
+            while (span := self.queue.get()) is not None:
+                name, cat, start, end, tid = span
+                f.write(",\n")
+                json.dump(
+                    {
+                        "name": name,
+                        "cat": cat,
+                        "ph": "X",
+                        "ts": (start - self.origin) * 1e6,
+                        "dur": (end - start) * 1e6,
+                        "pid": os.getpid(),
+                        "tid": tid,
+                    },
+                    f,
+                )
+            f.write("\n]\n")
+
+    def complete(self, name: str, start: float, end: float, entity=None, cat="frame"):
+        """
+        Records a span that already ended, named after the entity's type if given
+        """
+        if entity is not None:
+            name = f"{type(entity).__name__}.{name}"
+        try:
+            self.queue.put_nowait((name, cat, start, end, threading.get_ident()))
+        except queue.Full:
+            self.dropped += 1
+
+    def span(self, name: str, entity=None, cat="frame"):
+        """
+        with Tracer().span("render"): ...
+        """
+        if not Tracer.enabled:
+            return Tracer.NULL_SPAN
+        return self._span(name, entity, cat)
+
+    @contextmanager
+    def _span(self, name: str, entity, cat: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, start, perf_counter(), entity, cat)
+
+
+class Telemetry(metaclass=Singelton):
+    """
+    Frame times from GameManager.clock in a fixed histogram of 1 ms
+    buckets, preallocated so recording a frame allocates nothing.
+    flush() appends one JSONL summary (p50/p95/p99) of the frames
+    recorded since the last flush and starts over.
+    """
+
+    BUCKETS = 250  # the last bucket also counts every longer frame
+    enabled = False
+
+    def __init__(self):
+        self.path: str = None
+        self.counts = array("L", bytes(array("L").itemsize * Telemetry.BUCKETS))
+        self.frames = 0
+        self.total_ms = 0
+        self.max_ms = 0
+
+    def start(self, path: str):
+        self.path = path
+        Telemetry.enabled = True
+
+    def record(self, ms: int):
+        self.counts[ms if ms < Telemetry.BUCKETS else Telemetry.BUCKETS - 1] += 1
+        self.frames += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, p: float) -> int:
+        target = p * self.frames
+        seen = 0
+        for ms, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return ms
+        return Telemetry.BUCKETS - 1
+
+    def reset(self):
+        for i in range(Telemetry.BUCKETS):
+            self.counts[i] = 0
+        self.frames = self.total_ms = self.max_ms = 0
+
+    def flush(self, **labels):
+        """
+        labels (scene, match settings...) are added to the record
+        """
+        if not Telemetry.enabled or self.frames == 0:
+            return
+        record = {
+            **labels,
+            "time": wall_time(),
+            "frames": self.frames,
+            "mean_ms": self.total_ms / self.frames,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self.reset()
+
+
+class Profiler(metaclass=Singelton):
+    """
+    cProfile captures of the real game, toggled with KEY while
+    Profiler.hotkey is set, or started for every scene named in
+    Profiler.auto_scenes. A capture stops when its scene ends,
+    is dumped to DIR/<scene>_<timestamp>.pstats and the top
+    cumulative functions are printed.
+    A capture starts and stops on the thread that runs the game loop,
+    so it can't be used in pipelined mode, where scene changes and
+    input happen on the SimulationThread.
+    """
+
+    KEY = pygame.K_F9
+    DIR = "profiles"
+    TOP = 25
+    hotkey = False
+    auto_scenes: Set[str] = set()
+
+    def __init__(self):
+        self.profile: cProfile.Profile = None
+        self.scene = "scene"
+        self.label = ""
+        self.thread: int = None
+
+    def start(self):
+        self.label = self.scene
+        self.thread = threading.get_ident()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        print(f"Profiler: capturing {self.label}")
+
+    def stop(self):
+        assert (
+            threading.get_ident() == self.thread
+        ), "a capture must stop on the thread that started it"
+        self.profile.disable()
+        os.makedirs(Profiler.DIR, exist_ok=True)
+        path = os.path.join(
+            Profiler.DIR, f"{self.label}_{strftime('%Y%m%d-%H%M%S')}.pstats"
+        )
+        self.profile.dump_stats(path)
+        print(f"Profiler: wrote {path}")
+        pstats.Stats(self.profile).sort_stats("cumulative").print_stats(Profiler.TOP)
+        self.profile = None
+
+    def toggle(self):
+        if self.profile:
+            self.stop()
+        else:
+            self.start()
+
+    def on_scene_change(self, scene: str):
+        if self.profile:
+            self.stop()
+        self.scene = scene
+        if scene in Profiler.auto_scenes:
+            self.start()
+
+
+class LeakDetector(metaclass=Singelton):
+    """
+    Diagnostic mode for memory that grows across scene changes. On every
+    scene change it takes a tracemalloc snapshot and prints the top
+    growing allocation sites, the live Entity subclasses and the callback
+    entries, each compared to the last time the same scene started, so
+    repeated Restart cycles should show flat numbers.
+    """
+
+    FRAMES = 10  # traceback depth kept by tracemalloc
+    TOP = 10
+    enabled = False
+
+    def __init__(self):
+        self.snapshots: Dict[str, tracemalloc.Snapshot] = {}
+        self.counts: Dict[str, Counter] = {}
+
+    def start(self):
+        tracemalloc.start(LeakDetector.FRAMES)
+        LeakDetector.enabled = True
+
+    @staticmethod
+    def live_counts() -> Counter:
+        # an mro check, isinstance() on an ABC would fill its negative cache
+        counts = Counter(
+            type(obj).__name__
+            for obj in gc.get_objects()
+            if Entity in type(obj).__mro__
+        )
+        input_manager = InputManager()
+        for name in (
+            "callbacks_key_down",
+            "callbacks_key_up",
+            "callbacks_mouse_pressed",
+            "callbacks_mouse_released",
+        ):
+            callbacks: CallbacksDict = getattr(input_manager, name)
+            counts[f"InputManager.{name}"] = sum(map(len, callbacks.values()))
+        counts["InputManager.callbacks_mouse_scroll"] = len(
+            input_manager.callbacks_mouse_scroll
+        )
+        counts["UpdateManager.entityes_sorted"] = len(UpdateManager().entityes_sorted)
+        counts["RenderManager.entityes_sorted"] = len(RenderManager().entityes_sorted)
+        counts["GameManager.entities"] = len(GameManager().entities)
+        counts["Singelton._instances"] = len(Singelton._instances)
+        return counts
+
+    def on_scene_change(self, scene: str):
+        if not LeakDetector.enabled:
+            return
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ]
+        )
+        counts = LeakDetector.live_counts()
+        print(
+            f"LeakDetector: {scene}, traced "
+            f"{tracemalloc.get_traced_memory()[0] / 1024:.0f} KiB"
+        )
+        if scene in self.snapshots:
+            growing = [
+                stat
+                for stat in snapshot.compare_to(self.snapshots[scene], "lineno")
+                if stat.size_diff > 0
+            ]
+            print(f"  top growing sites since the last {scene}:")
+            for stat in growing[: LeakDetector.TOP]:
+                print(f"    {stat}")
+        previous = self.counts.get(scene, Counter())
+        print("  live objects:")
+        for name, count in sorted(counts.items()):
+            diff = count - previous[name]
+            growth = f" ({diff:+})" if scene in self.counts and diff else ""
+            print(f"    {name:<40}{count:>6}{growth}")
+        self.snapshots[scene] = snapshot
+        self.counts[scene] = counts
 
 
 class UpdateManager(metaclass=Singelton):
     FIXED_DT = 0.01
 
     def __init__(self):
-        self.entityes_sorted: list[Entity] = []
-        self.fixed_update_running = True
-        self.fixed_update_timer = None
+        self.entityes_sorted = LayeredQueue(attrgetter("update_order"))
 
     def register(self, entity: Entity):
-        bisect.insort_right(
-            self.entityes_sorted, entity, key=lambda item: item.update_order
-        )
+        self.entityes_sorted.add(entity)
 
     def unregister(self, entity: Entity):
-        _Utils.remove_from_sorted_list(
-            self.entityes_sorted, entity, key=lambda item: item.update_order
-        )
+        self.entityes_sorted.remove(entity)
 
     def update(self, dt):
+        if FrameStats.enabled or Tracer.enabled:
+            return self.update_profiled(dt)
         for entity in self.entityes_sorted:
             entity.update(dt)
 
-    def start_fixed_update_loop(self):
-        self.fixed_update_timer = Timer(
-            UpdateManager.FIXED_DT, self.start_fixed_update_loop
-        )
-        self.fixed_update_timer.start()
-        self.fixed_update()
-
-    def stop_fixed_update_loop(self):
-        if self.fixed_update_timer:
-            self.fixed_update_timer.cancel()
+    def update_profiled(self, dt):
+        stats = FrameStats.enabled and FrameStats()
+        tracer = Tracer.enabled and Tracer()
+        start = perf_counter()
+        for entity in self.entityes_sorted:
+            entity_start = perf_counter()
+            entity.update(dt)
+            entity_end = perf_counter()
+            if stats:
+                stats.add_type("update", entity, entity_end - entity_start)
+            if tracer:
+                tracer.complete("update", entity_start, entity_end, entity)
+        if stats:
+            stats.add("update", perf_counter() - start)
 
     def fixed_update(self):
+        if FrameStats.enabled or Tracer.enabled:
+            return self.fixed_update_profiled()
         ColliderManager().update()
         for entity in self.entityes_sorted:
             entity.fixed_update(UpdateManager.FIXED_DT)
 
+    def fixed_update_profiled(self):
+        stats = FrameStats.enabled and FrameStats()
+        tracer = Tracer.enabled and Tracer()
+        start = perf_counter()
+        with Tracer().span("colliders"):
+            if stats:
+                stats.timed("colliders", ColliderManager().update)
+            else:
+                ColliderManager().update()
+        for entity in self.entityes_sorted:
+            entity_start = perf_counter()
+            entity.fixed_update(UpdateManager.FIXED_DT)
+            entity_end = perf_counter()
+            if stats:
+                stats.add_type("fixed update", entity, entity_end - entity_start)
+            if tracer:
+                tracer.complete("fixed update", entity_start, entity_end, entity)
+        if stats:
+            stats.add("fixed update", perf_counter() - start)
+
 
 class RenderManager(metaclass=Singelton):
+    # above this share of the screen a dirty frame is redrawn whole
+    DIRTY_FULL_RATIO = 0.5
+    # regions an entity spans are merged unless their union is larger
+    # than this many times their own area, then it's drawn once per region
+    SPAN_MERGE_RATIO = 2
+
     def __init__(self):
-        self.entityes_sorted: List[Entity] = []
+        self.entityes_sorted = LayeredQueue(attrgetter("z_index"))
+        # entity -> (render_bounds(), snapshot() or None) of the last dirty
+        # frame, None: redraw all
+        self.dirty_state: Dict[Entity, Tuple[Tuple[Rect, ...], object]] = None
 
     def register(self, entity: Entity):
-        bisect.insort_right(self.entityes_sorted, entity, key=lambda item: item.z_index)
+        self.entityes_sorted.add(entity)
 
     def unregister(self, entity: Entity):
-        _Utils.remove_from_sorted_list(
-            self.entityes_sorted, entity, key=lambda item: item.z_index
-        )
+        self.entityes_sorted.remove(entity)
 
     def render(self, sur: Surface):
+        if FrameStats.enabled or Tracer.enabled:
+            return self.render_profiled(sur)
+        for entity in self.entityes_sorted:
+            if entity.should_render:
+                entity.render(sur)
+
+    def render_profiled(self, sur: Surface):
+        stats = FrameStats.enabled and FrameStats()
+        tracer = Tracer.enabled and Tracer()
+        start = perf_counter()
         for entity in self.entityes_sorted:
             if entity.should_render:
+                entity_start = perf_counter()
                 entity.render(sur)
+                entity_end = perf_counter()
+                if stats:
+                    stats.add_type("render", entity, entity_end - entity_start)
+                if tracer:
+                    tracer.complete("render", entity_start, entity_end, entity)
+        if stats:
+            stats.add("render", perf_counter() - start)
+
+    @staticmethod
+    def merge_rects(rects: Sequence[Rect]) -> List[Rect]:
+        """
+        Unions overlapping rects until none overlap
+        """
+        merged: List[Rect] = []
+        for rect in rects:
+            while (i := rect.collidelist(merged)) != -1:
+                rect = rect.union(merged.pop(i))
+            merged.append(rect)
+        return merged
+
+    @staticmethod
+    def merge_spanned(
+        rects: List[Rect], bounds: Iterable[Sequence[Rect]]
+    ) -> List[Rect]:
+        """
+        Unions the rects that the same bounds touch, unless the union
+        is more than SPAN_MERGE_RATIO times their area
+        """
+        merged = True
+        while merged:
+            merged = False
+            for entity_bounds in bounds:
+                hits = {i for rect in entity_bounds for i in rect.collidelistall(rects)}
+                if len(hits) < 2:
+                    continue
+                parts = [rects[i] for i in hits]
+                union = parts[0].unionall(parts[1:])
+                area = sum(rect.w * rect.h for rect in parts)
+                if union.w * union.h <= area * RenderManager.SPAN_MERGE_RATIO:
+                    rest = [rect for i, rect in enumerate(rects) if i not in hits]
+                    rects = RenderManager.merge_rects([union, *rest])
+                    merged = True
+        return rects
+
+    def render_dirty(self, sur: Surface, bg: Color) -> List[Rect]:
+        """
+        Dirty-rect mode: clears and redraws only where entities moved,
+        changed (their snapshot() differs), appeared or went away since
+        the last dirty frame, returns those regions for
+        pygame.display.update(). Regions an entity spans are merged
+        (see merge_spanned()), so an entity is usually drawn once,
+        clipped to its region, and once per region otherwise
+        """
+        screen = sur.get_rect()
+        previous = self.dirty_state
+        state: Dict[Entity, Tuple[Tuple[Rect, ...], object]] = {}
+        changed: List[Rect] = []
+        for entity in self.entityes_sorted:
+            if not entity.should_render:
+                continue
+            bounds = entity.render_bounds()
+            bounds = (screen,) if bounds is None else tuple(bounds)
+            last = previous.pop(entity, None) if previous else None
+            data = None
+            if last is None:
+                changed.extend(bounds)
+            elif last[0] != bounds:
+                changed.extend(last[0])
+                changed.extend(bounds)
+            else:
+                # only snapshot what kept its place, a moved entity is
+                # dirty anyway
+                data = entity.snapshot()
+                if data is None or data != last[1]:
+                    changed.extend(bounds)
+            state[entity] = (bounds, data)
+        if previous:
+            for bounds, _ in previous.values():  # gone since
+                changed.extend(bounds)
+        self.dirty_state = state
+
+        if previous is None:
+            dirty = [screen]
+        else:
+            dirty = self.merge_rects(
+                [clipped for rect in changed if (clipped := screen.clip(rect))]
+            )
+            dirty = self.merge_spanned(dirty, [bounds for bounds, _ in state.values()])
+            area = sum(rect.w * rect.h for rect in dirty)
+            if area > screen.w * screen.h * RenderManager.DIRTY_FULL_RATIO:
+                dirty = [screen]
+
+        for rect in dirty:
+            sur.set_clip(rect)
+            sur.fill(bg, rect)
+            for entity, (bounds, _) in state.items():
+                if rect.collidelist(bounds) != -1:
+                    entity.render(sur)
+        sur.set_clip(None)
+        return dirty
+
+    def invalidate(self):
+        """
+        The next dirty frame redraws the whole screen
+        """
+        self.dirty_state = None
+
+    def snapshot(self) -> "Frame":
+        return tuple(
+            (entity, entity.snapshot())
+            for entity in self.entityes_sorted
+            if entity.should_render
+        )
+
+    def render_snapshot(self, sur: Surface, frame: "Frame"):
+        for entity, data in frame:
+            if data is not None:
+                entity.render_snapshot(sur, data)
+            else:
+                with GameManager().sim_lock:
+                    if entity.state == EntityState.Started:
+                        entity.render(sur)
 
 
-# the callback should return true to stop propegate
-CallbacksDict = dict[int, list[tuple[Entity, Callable[[], bool]]]]
+# (entity, entity.snapshot()) in render order
+Frame = Tuple[Tuple[Entity, object], ...]
+
+
+# (order, entity, callback) sorted by order = (-entity.z_index, registration seq),
+# higher z_index first. the callback should return true to stop propegate
+CallbackEntry = tuple[tuple[int, int], Entity, Callable]
+CallbacksDict = dict[int, list[CallbackEntry]]
+_entry_order = itemgetter(0)
+
+
+class InputHandle:
+    """
+    Returned by the InputManager().register_* methods, remove()
+    unregisters the callback. Entity.kill() removes all of an entity's.
+    """
+
+    def __init__(
+        self, entries: list, entry: CallbackEntry, callbacks: CallbacksDict, key
+    ):
+        self.entries = entries
+        self.entry = entry
+        self.callbacks = callbacks
+        self.key = key
+
+    def _pop(self):
+        i = bisect.bisect_left(self.entries, self.entry[0], key=_entry_order)
+        if i < len(self.entries) and self.entries[i] is self.entry:
+            self.entries.pop(i)
+
+    def remove(self):
+        self._pop()
+        # drop emptied keys so the dicts only hold live listeners
+        if not self.entries and self.callbacks.get(self.key) is self.entries:
+            del self.callbacks[self.key]
+
+    def reorder(self):
+        """
+        Moves the entry to its owner's current z_index
+        """
+        (_, seq), entity, func = self.entry
+        self._pop()
+        self.entry = ((-entity.z_index, seq), entity, func)
+        bisect.insort_right(self.entries, self.entry, key=_entry_order)
 
 
 class InputManager(metaclass=Singelton):
@@ -360,48 +1172,66 @@ class InputManager(metaclass=Singelton):
         self.callbacks_key_up: CallbacksDict = {}
         self.callbacks_mouse_pressed: CallbacksDict = {}
         self.callbacks_mouse_released: CallbacksDict = {}
-        self.callbacks_mouse_scroll: List[Tuple[Entity, Callable[[Vector2], None]]] = []
-        self.update_callbacks_entities_order = False
-
-    def _update_callbacks_for(self, callbacks: CallbacksDict):
-        for val in callbacks.values():
-            val.sort(key=lambda e: e[0].z_index, reverse=True)
-        self.update_callbacks_entities_order = False
-
-    def update_callbacks_order(self):
-        self._update_callbacks_for(self.callbacks_key_down)
-        self._update_callbacks_for(self.callbacks_key_up)
-        self._update_callbacks_for(self.callbacks_mouse_pressed)
-        self._update_callbacks_for(self.callbacks_mouse_released)
+        self.callbacks_mouse_scroll: List[CallbackEntry] = []
+        self.handles: dict[Entity, list[InputHandle]] = {}
+        self.seq = count()
 
-    def _register_key(self, callbacks: CallbacksDict, key, entity: Entity, func):
+    def reorder(self, entity: Entity):
+        """
+        Keeps entity's callbacks in order after its z_index changed
+        """
+        for handle in self.handles.get(entity, ()):
+            handle.reorder()
+
+    def _add_handle(self, entity: Entity, handle: InputHandle) -> InputHandle:
+        if entity not in self.handles:
+            self.handles[entity] = []
+        self.handles[entity].append(handle)
+        return handle
+
+    def _insert(
+        self, entries: list[CallbackEntry], entity: Entity, func
+    ) -> CallbackEntry:
+        entry = ((-entity.z_index, next(self.seq)), entity, func)
+        bisect.insort_right(entries, entry, key=_entry_order)
+        return entry
+
+    def _register_key(
+        self, callbacks: CallbacksDict, key, entity: Entity, func
+    ) -> InputHandle:
         if key not in callbacks:
             callbacks[key] = []
-        callbacks[key].append((entity, func))
-        self.update_callbacks_entities_order = True
-        # idx = bisect.bisect([e.z_index for e, _ in callbacks[key]], entity.z_index)
-        # callbacks[key].insert(idx, (entity, func))
+        entry = self._insert(callbacks[key], entity, func)
+        handle = InputHandle(callbacks[key], entry, callbacks, key)
+        return self._add_handle(entity, handle)
 
     def register_key_down(self, key, entity: Entity, func):
-        self._register_key(self.callbacks_key_down, key, entity, func)
-        return self
+        return self._register_key(self.callbacks_key_down, key, entity, func)
 
     def register_key_up(self, key, entity, func):
-        self._register_key(self.callbacks_key_up, key, entity, func)
-        return self
+        return self._register_key(self.callbacks_key_up, key, entity, func)
 
     def register_mouse_pressed(self, button, entity, func):
-        self._register_key(self.callbacks_mouse_pressed, button, entity, func)
-        return self
+        return self._register_key(self.callbacks_mouse_pressed, button, entity, func)
 
     def register_mouse_released(self, button, entity, func):
-        self._register_key(self.callbacks_mouse_released, button, entity, func)
+        return self._register_key(self.callbacks_mouse_released, button, entity, func)
 
     def register_mouse_scroll(self, entity, func):
-        self.callbacks_mouse_scroll.append((entity, func))
+        entry = self._insert(self.callbacks_mouse_scroll, entity, func)
+        return self._add_handle(
+            entity, InputHandle(self.callbacks_mouse_scroll, entry, {}, None)
+        )
+
+    def unregister(self, entity: Entity):
+        """
+        Removes every callback of entity
+        """
+        for handle in self.handles.pop(entity, ()):
+            handle.remove()
 
     def _trigger_key(callbacks: CallbacksDict, key):
-        for entity, func in callbacks.get(key, []):
+        for _, entity, func in callbacks.get(key, []):
             if entity in GameManager().entities:
                 if func():
                     break
@@ -419,7 +1249,7 @@ class InputManager(metaclass=Singelton):
         InputManager._trigger_key(self.callbacks_mouse_released, button)
 
     def trigger_mouse_scroll(self, scroll):
-        for entity, func in self.callbacks_mouse_scroll:
+        for _, entity, func in self.callbacks_mouse_scroll:
             if entity in GameManager().entities:
                 func(scroll)
 
@@ -427,19 +1257,24 @@ class InputManager(metaclass=Singelton):
         self.callbacks_key_down.clear()
         self.callbacks_key_up.clear()
         self.callbacks_mouse_pressed.clear()
+        self.callbacks_mouse_released.clear()
         self.callbacks_mouse_scroll.clear()
+        self.handles.clear()
         return self
 
-    def update(self):
+    def update(self, events: Sequence[pygame.event.Event] = None):
         """
-        returns True if got a quit event
+        returns True if got a quit event.
+        events are pulled from pygame.event.get() if not given
         """
-        if self.update_callbacks_entities_order:
-            self.update_callbacks_order()
-        for event in pygame.event.get():
+        if events is None:
+            events = pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 return True
             elif event.type == pygame.KEYDOWN:
+                if Profiler.hotkey and event.key == Profiler.KEY:
+                    Profiler().toggle()
                 self.trigger_key_down(event.key)
 
             elif event.type == pygame.KEYUP:
@@ -453,6 +1288,9 @@ class InputManager(metaclass=Singelton):
 
             elif event.type == pygame.MOUSEWHEEL:
                 self.trigger_mouse_scroll(Vector2(event.precise_x, event.precise_y))
+
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESIZED):
+                RenderManager().invalidate()
         return False
 
 
@@ -475,14 +1313,52 @@ class ColliderManager(metaclass=Singelton):
                 self.edges[type_a] = set()
             self.edges[type_a].add(type_b)
 
+    CELL_SIZE = 64
+
     def __init__(self):
         super().__init__()
         self.graph = ColliderManager.Graph()
         self.collision_functions_dict: dict[tuple[type, type], CollisionFunction] = {}
+        self.wrap_size: Size = None
+        # compiled from the above by compile(), None when out of date
+        self.plan: list[tuple[list[Entity], SpatialHash, CollisionFunction]] = None
+        self.targets: list[tuple[list[Entity], SpatialHash]] = []
+        self.sources: list[list[Entity]] = []
+        self.declared: set[type] = set()
+
+    def set_wrap_size(self, wrap_size: Size):
+        """
+        Makes the world toroidal: bounds overlapping an edge
+        also overlap bounds near the opposite edge
+        """
+        self.wrap_size = wrap_size
+        self.plan = None
 
     def register(self, entity: Entity):
+        if type(entity) not in self.graph.nodes:
+            self.resolve(type(entity))
         self.graph.add_node(entity)
 
+    def resolve(self, entity_type: type):
+        """
+        Once per type: describes the collision functions declared by it
+        and its bases (compile() hands them down to subclasses)
+        """
+        for base_type in entity_type.mro():
+            if base_type is CollideEntity:
+                break
+            if base_type in self.declared:
+                break  # so are its bases
+            self.declared.add(base_type)
+            if "register_collision_functions" in base_type.__dict__:
+                for collision_data in base_type.register_collision_functions():
+                    self.describe_collision(
+                        base_type,
+                        collision_data.type_other,
+                        collision_data.collision_function,
+                    )
+        self.plan = None
+
     def unregister(self, entity: Entity):
         self.graph.remove_node(entity)
 
@@ -500,17 +1376,98 @@ class ColliderManager(metaclass=Singelton):
         self.collision_functions_dict[(entity_type, other_entity_type)] = (
             check_collision
         )
+        self.plan = None
+
+    def compile(self):
+        """
+        Resolves every described (type, other type) pair into (entities,
+        grid of others, function) triples over the registered types, the
+        function of the closest bases wins. The node lists are shared
+        with the graph, so only new types or descriptions recompile.
+        """
+        types = list(self.graph.nodes)
+        best: dict[tuple[type, type], tuple[tuple[int, int], CollisionFunction]] = {}
+        functions = self.collision_functions_dict
+        for (entity_type, other_type), function in functions.items():
+            for source in types:
+                if not issubclass(source, entity_type):
+                    continue
+                for target in types:
+                    if not issubclass(target, other_type) or not (
+                        source.COLLISION_MASK & target.COLLISION_LAYER
+                        and target.COLLISION_MASK & source.COLLISION_LAYER
+                    ):
+                        continue
+                    rank = (
+                        source.mro().index(entity_type),
+                        target.mro().index(other_type),
+                    )
+                    if (source, target) not in best or rank < best[(source, target)][0]:
+                        best[(source, target)] = (rank, function)
+
+        grids: dict[type, SpatialHash] = {}
+        self.plan = []
+        for (source, target), (_, function) in best.items():
+            if target not in grids:
+                grids[target] = SpatialHash(ColliderManager.CELL_SIZE, self.wrap_size)
+            self.plan.append((self.graph.nodes[source], grids[target], function))
+        self.targets = [
+            (self.graph.nodes[target], grid) for target, grid in grids.items()
+        ]
+        self.sources = list({id(nodes): nodes for nodes, _, _ in self.plan}.values())
+
+    def overlap(self, rect: Rect, other_rect: Rect):
+        if not self.wrap_size:
+            return rect.colliderect(other_rect)
+        w, h = self.wrap_size
+        dx = (other_rect.centerx - rect.centerx + w / 2) % w - w / 2
+        dy = (other_rect.centery - rect.centery + h / 2) % h - h / 2
+        return (
+            abs(dx) * 2 < rect.w + other_rect.w and abs(dy) * 2 < rect.h + other_rect.h
+        )
 
     def update(self):
-        for entity_type in self.graph.edges:
-            for other_entity_type in self.graph.edges[entity_type]:
-                if entity_type in self.graph.nodes:
-                    for entity in self.graph.nodes[entity_type]:
-                        if other_entity_type in self.graph.nodes:
-                            for other_entity in self.graph.nodes[other_entity_type]:
-                                self.collision_functions_dict[
-                                    (entity_type, other_entity_type)
-                                ](entity, other_entity)
+        """
+        Broad phase: every entity some edge targets goes into a grid by
+        its transform.rect(), so a collision function is only called
+        for pairs whose rects overlap
+        """
+        if self.plan is None:
+            self.compile()
+        if not self.plan:
+            return
+        profiled = FrameStats.enabled
+        rects: dict[Entity, Rect] = {}
+        for entities in self.sources:
+            for entity in entities:
+                rects[entity] = entity.transform.rect()
+        for entities, grid in self.targets:
+            grid.clear()
+            for entity in entities:
+                rect = rects.get(entity)
+                if rect is None:
+                    rect = rects[entity] = entity.transform.rect()
+                grid.insert_area(rect.topleft, rect.bottomright, entity)
+
+        for entities, grid, function in self.plan:
+            for entity in entities:
+                rect = rects[entity]
+                mask = entity.collision_mask
+                layer = entity.collision_layer
+                # an entity spanning several cells is yielded once per cell
+                candidates = dict.fromkeys(
+                    grid.query_area(rect.topleft, rect.bottomright)
+                )
+                if profiled:
+                    FrameStats().collision_tests += len(candidates)
+                for other_entity in candidates:
+                    if (
+                        other_entity is not entity
+                        and mask & other_entity.collision_layer
+                        and other_entity.collision_mask & layer
+                        and self.overlap(rect, rects[other_entity])
+                    ):
+                        function(entity, other_entity)
 
 
 class EmptyEntity(Entity):
@@ -519,12 +1476,21 @@ class EmptyEntity(Entity):
 
 
 class GameManager(metaclass=Singelton):
+    MAX_DT = 0.25  # longer frames (hitches, dragged window) are clamped
+    # fixed steps per frame, past this the simulation falls behind
+    # instead of taking longer every frame to catch up
+    MAX_FIXED_STEPS = 5
+
     def __init__(self):
         self.entities: set[Entity] = set()
         self.clock = pygame.time.Clock()
         self.dt = 0
+        self.fixed_accumulator = 0
+        self.interpolation = 0
         self.fps = 60
         self.should_exit = False
+        self.sim_lock = threading.RLock()
+        self.telemetry = Telemetry()
         self.to_destroy: list[Entity] = []
         self.to_add: list[Entity] = []
         if not pygame.font.get_init():
@@ -564,27 +1530,77 @@ class GameManager(metaclass=Singelton):
             entities = (e for e in entities if e not in exceptions)
         self.destroy(*entities)
 
-    def update(self):
-        should_quit = InputManager().update()
+    def update(self, events: Sequence[pygame.event.Event] = None):
+        with Tracer().span("GameManager.update"):
+            self._update(events)
+
+    def _update(self, events: Sequence[pygame.event.Event]):
+        with Tracer().span("input"):
+            if FrameStats.enabled:
+                should_quit = FrameStats().timed(
+                    "input", InputManager().update, events
+                )
+            else:
+                should_quit = InputManager().update(events)
         self.should_exit |= should_quit
 
-        UpdateManager().update(self.dt)
+        dt = min(self.dt, GameManager.MAX_DT)
+        with Tracer().span("fixed updates"):
+            self.run_fixed_updates(dt)
+        with Tracer().span("update"):
+            UpdateManager().update(dt)
 
         for entity in self.to_destroy:
             if entity in self.entities:
                 self.entities.remove(entity)
-                entity.kill()  # self.to_destroy may expand here and it's fine
+                with Tracer().span("kill", entity, "lifecycle"):
+                    entity.kill()  # self.to_destroy may expand here and it's fine
         self.to_destroy.clear()
         for entity in self.to_add:
             if entity not in self.entities:
                 self.entities.add(entity)
-                entity.start()  # self.to_add may expand here and it's fine
+                with Tracer().span("start", entity, "lifecycle"):
+                    entity.start()  # self.to_add may expand here and it's fine
 
         self.to_add.clear()
 
+    def run_fixed_updates(self, dt):
+        """
+        Runs as many UpdateManager().fixed_update() steps as fit in the
+        time accumulated so far, the remainder carries over to the next
+        frame, up to MAX_FIXED_STEPS and the rest is dropped. interpolation
+        is how far (0 to 1) the current frame is between the last two
+        fixed steps, for rendering in between.
+        """
+        self.fixed_accumulator += dt
+        steps = 0
+        while self.fixed_accumulator >= UpdateManager.FIXED_DT:
+            if steps == GameManager.MAX_FIXED_STEPS:
+                self.fixed_accumulator = 0
+                break
+            UpdateManager().fixed_update()
+            self.fixed_accumulator -= UpdateManager.FIXED_DT
+            steps += 1
+        self.interpolation = self.fixed_accumulator / UpdateManager.FIXED_DT
+
     def render(self, sur: Surface):
-        RenderManager().render(sur)
-        self.dt = self.clock.tick(self.fps) / 1000.0
+        with Tracer().span("GameManager.render"):
+            RenderManager().render(sur)
+        self.tick()
+
+    def render_dirty(self, sur: Surface, bg: Color) -> List[Rect]:
+        with Tracer().span("GameManager.render"):
+            rects = RenderManager().render_dirty(sur, bg)
+        self.tick()
+        return rects
+
+    def tick(self):
+        ms = self.clock.tick(self.fps)
+        self.dt = ms / 1000.0
+        if Telemetry.enabled:
+            self.telemetry.record(ms)
+        if FrameStats.enabled:
+            FrameStats().end_frame(self.dt)
 
     def render_debug(self, sur: Surface):
         self.render(sur)
@@ -607,6 +1623,61 @@ class GameManager(metaclass=Singelton):
             + Vector2Left() * horz_pad
             + Vector2Left() * entities_count_sur.get_width(),
         )
+        if FrameStats.enabled:
+            FrameStats().render(sur, Pos(10, 10))
+
+
+class SimulationThread:
+    """
+    Pipelined mode: runs GameManager().update() one frame ahead on a worker
+    thread while the main thread draws the previous frame's snapshot
+    with RenderManager().render_snapshot(). See main.py --pipelined
+    """
+
+    def __init__(self):
+        self.events: Sequence[pygame.event.Event] = ()
+        self.frame: Frame = ()
+        self.error: BaseException = None
+        self.running = True
+        self.go = threading.Semaphore(0)
+        self.done = threading.Semaphore(0)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            self.go.acquire()
+            if not self.running:
+                return
+            try:
+                with GameManager().sim_lock:
+                    GameManager().update(self.events)
+                    self.frame = RenderManager().snapshot()
+            except BaseException as e:
+                self.error = e
+            self.done.release()
+
+    def step(self, events: Sequence[pygame.event.Event]):
+        """
+        Starts simulating the next frame, events must be
+        pulled on the main thread
+        """
+        self.events = events
+        self.go.release()
+
+    def join(self) -> Frame:
+        """
+        Waits for the frame started by step() and returns its snapshot
+        """
+        self.done.acquire()
+        if self.error:
+            raise self.error
+        return self.frame
+
+    def stop(self):
+        self.running = False
+        self.go.release()
+        self.thread.join()
 
 
 class UiButton(Entity):
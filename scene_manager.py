@@ -361,16 +361,25 @@ class Gameplay(Entity):
             GameManager().destroy(self)
 
     def render(self, sur):
+        sur.blit(*self.snapshot())
+
+    def snapshot(self):
         if self.countdown_ceiled >= 0:
-            sur.blit(
+            return (
                 self.game_countdown_sur,
                 (Size(W, H) - Size(self.game_countdown_sur.get_size())) / 2,
             )
-        else:
-            sur.blit(
-                self.timer_sur,
-                Pos((W - self.timer_sur.get_width()) / 2, Gameplay.TIMER_PAD_Y),
-            )
+        return (
+            self.timer_sur,
+            Pos((W - self.timer_sur.get_width()) / 2, Gameplay.TIMER_PAD_Y),
+        )
+
+    def render_snapshot(self, sur, data):
+        sur.blit(*data)
+
+    def render_bounds(self):
+        text_sur, pos = self.snapshot()
+        return (text_sur.get_rect(topleft=pos),)
 
     def kill(self):
         super().kill()
@@ -501,6 +510,7 @@ class SceneManager(metaclass=Singelton):
     def __init__(self):
         super().__init__()
         self.scene_type = SceneType.MAIN_MENU
+        ColliderManager().set_wrap_size(Size(W, H))
 
     def scene_main_menu(self):
         GameManager().instatiate(MainMenu())
@@ -511,13 +521,27 @@ class SceneManager(metaclass=Singelton):
     def scene_gameover(self):
         GameManager().instatiate(GameOver())
 
+    def flush_telemetry(self):
+        Telemetry().flush(
+            scene=self.scene_type.name,
+            bots_count=settings.bots_count,
+            players_count=settings.players_count,
+        )
+
     def set_scene(self, scene_type: SceneType):
-        GameManager().clear_scene(exceptions={FruitsSpawner(), SnakeCollisionManager()})
-
-        self.scene_type = scene_type
-        if scene_type == SceneType.MAIN_MENU:
-            self.scene_main_menu()
-        elif scene_type == SceneType.GAMEPLAY:
-            self.scene_gameplay()
-        elif scene_type == SceneType.GAME_OVER:
-            self.scene_gameover()
+        self.flush_telemetry()
+        Profiler().on_scene_change(scene_type.name)
+        LeakDetector().on_scene_change(scene_type.name)
+        with Tracer().span(f"set_scene {scene_type.name}", cat="scene"):
+            GameManager().clear_scene(
+                exceptions={FruitsSpawner(), SnakeCollisionManager()}
+            )
+
+            self.scene_type = scene_type
+            RenderManager().invalidate()
+            if scene_type == SceneType.MAIN_MENU:
+                self.scene_main_menu()
+            elif scene_type == SceneType.GAMEPLAY:
+                self.scene_gameplay()
+            elif scene_type == SceneType.GAME_OVER:
+                self.scene_gameover()
@@ -1,32 +1,50 @@
 from dataclasses import field
+from itertools import pairwise
 import math
 from random import randint, random
 from typing import Dict
 import random
 from fruit import Fruit, FruitsSpawner, ShieldFruit
 from globals import *
+from nodes import BodyBounds, NodeChain, Nodes
 from pyengine import *
 from ui import Bar, Score
-from utils import draw_border, resource_path, shortest_vector, wrap, wrap_ip
+from utils import (
+    draw_border,
+    draw_rect_border,
+    points_rect,
+    resource_path,
+    segment_point_distance_squared,
+    segments_cross,
+    shortest_distance_squared,
+    shortest_vector,
+    sweep_bounds,
+    wrap_ip,
+)
 
 
 class SnakeCollisionManager(SingeltonEntity):
     SKIN_DISAPPEAR_AFTER_SECS = 10
     BLINK_SKIN_FREQ = 0.5
+    BLINK_FRAMES = 16
     REJOIN_R = 20
+    UPDATE_ORDER = 1  # after all snakes moved
+    SWEEPS_CELL = 64
 
     @dataclass
     class NodeData:
         timer: float = 0
-        nodes: List[Pos] = field(default_factory=list)
+        nodes: Nodes = field(default_factory=NodeChain)
 
     def __init__(self):
         super().__init__()
         self.snakes: List[Snake] = []
         self.cut_skins: Dict[int, SnakeCollisionManager.NodeData] = {}
-        self.circle_sur = pygame.Surface(
-            (Snake.NODE_R * 2, Snake.NODE_R * 2), pygame.SRCALPHA
-        )
+        self.nodes_grid = SpatialHash(Snake.NODE_R, Size(W, H))
+        self.segments_grid = SpatialHash(Snake.DIST_BETWEEN_NODES, Size(W, H))
+        self.sweeps_grid = SpatialHash(SnakeCollisionManager.SWEEPS_CELL, Size(W, H))
+        self.update_order = SnakeCollisionManager.UPDATE_ORDER
+        self.blink_frames: Dict[Tuple[int, ...], List[Tuple[Surface, Color]]] = {}
         self.cut_sound = pygame.mixer.Sound(resource_path("assets/audio/cut.ogg"))
 
     def reset(self):
@@ -42,53 +60,126 @@ class SnakeCollisionManager(SingeltonEntity):
         assert node_attacked_idx > 0
         self.cut_skins[snake_attacked.id] = SnakeCollisionManager.NodeData(
             SnakeCollisionManager.SKIN_DISAPPEAR_AFTER_SECS,
-            snake_attacked.nodes[node_attacked_idx:],
+            snake_attacked.nodes.split(node_attacked_idx),
         )
-        snake_attacked.nodes = snake_attacked.nodes[:node_attacked_idx]
 
         snake_attacked.speed = snake_attacked.calc_speed()
         if settings.sound_effects:
             self.cut_sound.play()
 
-    def check_attack(self, snake_attacker: "Snake", snake_attacked: "Snake"):
-        assert len(snake_attacked.nodes) > 1
-        for i in range(1, len(snake_attacked.nodes)):
-            if (
-                snake_attacker.nodes[0].distance_to(snake_attacked.nodes[i])
-                < Snake.NODE_R
-            ):
-                self.on_collision(snake_attacker, snake_attacked, i)
-                break
-
     def rejoin(self, snake: "Snake"):
-        self.cut_skins[snake.id].nodes.extend(snake.nodes)
+        self.cut_skins[snake.id].nodes.concat(snake.nodes)
         snake.nodes = self.cut_skins[snake.id].nodes
         self.cut_skins.pop(snake.id)
         snake.transform.pos = snake.nodes[0]
+        snake.head_step = Vector2()
         snake.speed = snake.calc_speed()
         if len(snake.nodes) > 1:
             snake.dir = (snake.nodes[0] - snake.nodes[1]).normalize()
 
     def check_collisions(self):
-        if len(self.snakes) < 2:
-            return
-        for cur in self.snakes:
-            for other in self.snakes[1:]:
-                if len(other.nodes) > 1 and other.shield_timer <= 0:
-                    self.check_attack(cur, other)
-                if len(cur.nodes) > 1 and cur.shield_timer <= 0:
-                    self.check_attack(other, cur)
-
-            # check rejoin tail:
-            if cur.id in self.cut_skins:
+        """
+        One collision phase per frame, run after all snakes moved.
+        The bodies of all attackable snakes share a single grid,
+        so each head is only compared to the nodes around it, and
+        body chunks no other head is near never enter it. The head
+        sweeps share a grid too, so each body only looks at the heads
+        around it, not at every other snake.
+        Heads are tested along the segment they swept this frame,
+        so fast snakes can't jump over a body between two frames.
+        """
+        self.nodes_grid.clear()
+        self.segments_grid.clear()
+        self.sweeps_grid.clear()
+        # a circle around each head sweep, wide enough for every node and
+        # segment the sweep can hit, looked up by the body bounds
+        sweeps = []
+        attackers = set()  # indices of the heads near some body chunk
+        for k, attacker in enumerate(self.snakes):
+            start, step = attacker.head_sweep()
+            x, y = start + step / 2
+            r = step.length() / 2 + Snake.NODE_R + Snake.DIST_BETWEEN_NODES
+            sweeps.append((x, y, r))
+            self.sweeps_grid.insert_area((x - r, y - r), (x + r, y + r), k)
+        for k, snake in enumerate(self.snakes):
+            if len(snake.nodes) > 1 and snake.shield_timer <= 0:
+                # only chunks some other head got close to enter the grids
+                snake.bounds.fit(snake.nodes)
+                chunks = snake.bounds.chunks_near(sweeps, self.sweeps_grid, k)
+                if not chunks:
+                    continue
+                for hits in chunks.values():
+                    attackers.update(hits)
+                for c in chunks:
+                    first = max(1, c * BodyBounds.CHUNK_LEN)
+                    points = snake.nodes.points(
+                        first - 1, (c + 1) * BodyBounds.CHUNK_LEN
+                    )
+                    for i, (prev, node) in enumerate(pairwise(points), first):
+                        self.nodes_grid.insert(node, (snake, i, node))
+                        step = shortest_vector(prev, node)
+                        self.segments_grid.insert(
+                            prev + step / 2, (snake, i, prev, node)
+                        )
+
+        for k, attacker in enumerate(self.snakes):
+            if k not in attackers:
+                continue
+            sweep_start, sweep_step = attacker.head_sweep()
+            area = sweep_bounds(sweep_start, sweep_step)
+            nodes_near = self.nodes_grid.query_area(*area)
+            segments_near = self.segments_grid.query_area(*area)
+            if FrameStats.enabled:
+                nodes_near, segments_near = list(nodes_near), list(segments_near)
+                FrameStats().collision_tests += len(nodes_near) + len(segments_near)
+            hits: Dict[Snake, int] = {}
+            for attacked, i, node in nodes_near:
+                # indices past a cut made earlier in this phase are stale
+                if attacked is attacker or i >= len(attacked.nodes):
+                    continue
+                if (
+                    i < hits.get(attacked, len(attacked.nodes))
+                    and segment_point_distance_squared(sweep_start, sweep_step, node)
+                    < Snake.NODE_R**2
+                ):
+                    hits[attacked] = i
+            for attacked, i, prev, node in segments_near:
+                if attacked is attacker or i >= len(attacked.nodes):
+                    continue
+                if i < hits.get(attacked, len(attacked.nodes)) and segments_cross(
+                    sweep_start, sweep_step, prev, shortest_vector(prev, node)
+                ):
+                    hits[attacked] = i
+            for attacked, i in hits.items():
+                if i < len(attacked.nodes):
+                    self.on_collision(attacker, attacked, i)
+        self.nodes_grid.clear()
+        self.segments_grid.clear()
+
+        # check rejoin tail:
+        for snake in self.snakes:
+            if snake.id in self.cut_skins:
                 if (
-                    cur.transform.pos.distance_to(self.cut_skins[cur.id].nodes[-1])
+                    snake.transform.pos.distance_to(self.cut_skins[snake.id].nodes[-1])
                     < SnakeCollisionManager.REJOIN_R
                 ):
-                    self.rejoin(cur)
+                    self.rejoin(snake)
+
+    def run_check_collisions(self):
+        if FrameStats.enabled:
+            FrameStats().timed("snake collisions", self.check_collisions)
+        else:
+            self.check_collisions()
+
+    def fixed_update(self, fixed_dt):
+        super().fixed_update(fixed_dt)
+        if Snake.FIXED_STEP and not Snake.pause:
+            self.run_check_collisions()
 
     def update(self, dt):
         super().update(dt)
+        if not Snake.FIXED_STEP and not Snake.pause:
+            self.run_check_collisions()
         to_remove = []
         for i, node_data in self.cut_skins.items():
             if node_data.timer <= 0:
@@ -97,39 +188,71 @@ class SnakeCollisionManager(SingeltonEntity):
         for i in to_remove:
             self.cut_skins.pop(i)
 
-    def render(self, sur):
-        for i, node_data in self.cut_skins.items():
-            self.circle_sur.fill(Color(0, 0, 0, 0))
-            color_with_alpha = Color(self.snakes[i].color)
-            alpha = int(
-                (
-                    (
-                        sin(
-                            2
-                            * math.pi
-                            * SnakeCollisionManager.BLINK_SKIN_FREQ
-                            * node_data.timer
-                        )
-                        + 1
-                    )
-                    / 4
-                    + 0.5
+    def get_blink_frames(self, color: Color) -> List[Tuple[Surface, Color]]:
+        """
+        (circle sprite, color) per step of the blink cycle,
+        baked once per snake color
+        """
+        key = tuple(color)
+        if key not in self.blink_frames:
+            frames = []
+            for k in range(SnakeCollisionManager.BLINK_FRAMES):
+                phase = k / SnakeCollisionManager.BLINK_FRAMES
+                color_with_alpha = Color(color)
+                color_with_alpha.a = int(
+                    ((sin(2 * math.pi * phase) + 1) / 4 + 0.5) * 255
                 )
-                * 255
-            )
-            color_with_alpha.a = alpha
-            pygame.draw.circle(
-                self.circle_sur,
-                color_with_alpha,
-                (Snake.NODE_R, Snake.NODE_R),
-                Snake.NODE_R,
+                circle_sur = pygame.Surface(
+                    (Snake.NODE_R * 2, Snake.NODE_R * 2), pygame.SRCALPHA
+                )
+                pygame.draw.circle(
+                    circle_sur,
+                    color_with_alpha,
+                    (Snake.NODE_R, Snake.NODE_R),
+                    Snake.NODE_R,
+                )
+                frames.append((circle_sur, color_with_alpha))
+            self.blink_frames[key] = frames
+        return self.blink_frames[key]
+
+    def get_blink_frame(self, i: int) -> Tuple[Surface, Color]:
+        phase = self.cut_skins[i].timer * SnakeCollisionManager.BLINK_SKIN_FREQ % 1
+        return self.get_blink_frames(self.snakes[i].color)[
+            int(phase * SnakeCollisionManager.BLINK_FRAMES)
+        ]
+
+    def render(self, sur):
+        self.render_snapshot(
+            sur,
+            [
+                (*self.get_blink_frame(i), node_data.nodes.points())
+                for i, node_data in self.cut_skins.items()
+            ],
+        )
+
+    def snapshot(self):
+        return tuple(
+            (*self.get_blink_frame(i), tuple(map(tuple, node_data.nodes.points())))
+            for i, node_data in self.cut_skins.items()
+        )
+
+    def render_bounds(self):
+        bounds = []
+        for node_data in self.cut_skins.values():
+            bounds.append(points_rect(node_data.nodes.points(), Snake.NODE_R + 1))
+            bounds.append(
+                points_rect([node_data.nodes[-1]], SnakeCollisionManager.REJOIN_R + 1)
             )
-            for node in node_data.nodes:
-                sur.blit(self.circle_sur, node - Size(self.circle_sur.get_size()) / 2)
+        return bounds
+
+    def render_snapshot(self, sur, data):
+        r = Snake.NODE_R
+        for circle_sur, color_with_alpha, nodes in data:
+            sur.fblits([(circle_sur, (x - r, y - r)) for x, y in nodes])
             pygame.draw.circle(
                 sur,
                 color_with_alpha,
-                node_data.nodes[-1],
+                nodes[-1],
                 SnakeCollisionManager.REJOIN_R,
                 1,
             )
@@ -185,6 +308,17 @@ class SnakeInfoDisplay(Entity):
     def render(self, sur):
         draw_border(self, sur, self.snake.color)
 
+    def snapshot(self):
+        return self.transform.rect(), Color(self.snake.color)
+
+    def render_snapshot(self, sur, data):
+        draw_rect_border(sur, *data)
+
+    def render_bounds(self):
+        rect = self.transform.rect()
+        rect.normalize()  # too many snakes leave no room, the width goes negative
+        return (rect.inflate(2, 2),)
+
 
 class Snake(Entity):
     NODE_R = 5
@@ -195,8 +329,13 @@ class Snake(Entity):
     MAX_DASH_LEVEL_SECS = 2
     DASH_INC_PER_SEC = 0.2
     INFO_PAD = 30
+    SHIELD_R = NODE_R + 2
+    SPRITE_OFFSET = Size(SHIELD_R)
+    NODES_TYPE: type = NodeChain  # or nodes.NodeArray, nodes.NodePath
+    FIXED_STEP = True  # move on UpdateManager.FIXED_DT steps, render interpolated
     snake_count = 0
     pause = False
+    node_sprites: Dict[Tuple[Tuple[int, ...], bool], Surface] = {}
 
     def __init__(self, pos: Pos, keys=SnakeKeys()):
         super().__init__()
@@ -208,7 +347,12 @@ class Snake(Entity):
         self.transform.pos = pos
         self.dir = Vector2(random.random() - 0.5, random.random() - 0.5).normalize()
         self.turning_dir = 0
-        self.nodes: List[Vector2] = [self.transform.pos.copy()]
+        self.nodes: Nodes = Snake.NODES_TYPE([self.transform.pos.copy()])
+        # cells as wide as a segment, see find_loop()
+        self.nodes_grid = SpatialHash(Snake.DIST_BETWEEN_NODES, Size(W, H))
+        self.body: List[Pos] = []  # the nodes during check_collisions()
+        self.head_step = Vector2()
+        self.bounds = BodyBounds()
         self.speed_multiplier = 1
         self.shield_timer = 0
         self.speed = self.calc_speed()
@@ -252,7 +396,7 @@ class Snake(Entity):
         fruit.trigger_hit(self)
 
     def add_node(self):
-        self.nodes.insert(0, self.nodes[0] + self.dir * Snake.DIST_BETWEEN_NODES)
+        self.nodes.push_front(self.nodes[0] + self.dir * Snake.DIST_BETWEEN_NODES)
         self.transform.pos = self.nodes[0]
         self.speed = self.calc_speed()
 
@@ -294,28 +438,107 @@ class Snake(Entity):
         self.on_dash_up()
 
     def on_collision(self, first, last):
-        del self.nodes[first:last]
+        self.nodes.delete_range(first, last)
         assert len(self.nodes) > 0
         self.transform.pos = self.nodes[0]
+        if first == 0:
+            self.head_step = Vector2()
         self.speed = self.calc_speed()
         if settings.sound_effects:
             self.loop_completed_sound.play()
         self.info_display.score.add_score(Snake.score_func(last - first))
 
+    def head_sweep(self) -> Tuple[Pos, Vector2]:
+        """
+        returns (start, step) of the segment the head moved along this frame
+        """
+        return self.transform.pos - self.head_step, self.head_step
+
+    def fill_nodes_grid(self):
+        self.body = self.nodes.points()
+        self.nodes_grid.clear()
+        for j, node in enumerate(self.body):
+            self.nodes_grid.insert(node, j)
+
+    def segment(self, k: int) -> Tuple[Pos, Vector2]:
+        """
+        returns (start, step) of the body segment from node k to node k + 1
+        """
+        return self.body[k], shortest_vector(self.body[k], self.body[k + 1])
+
+    def find_loop(self, start: int):
+        """
+        returns the first (i, j) with i >= start and j > i such that
+        node j touches node i, the segment ending at node i crosses
+        the segment ending at node j, or for i == 0, the head swept
+        over the segment ending at node j. None if there is no loop
+
+        Two crossing segments each pass within half their length of
+        one of their ends, so they always have ends closer than
+        DIST_BETWEEN_NODES. Only the segments around the pairs of
+        nodes that close are tested for crossing
+        """
+        body = self.body
+        near = Snake.DIST_BETWEEN_NODES**2
+        touch = Snake.NODE_R**2
+        first: List[int] = [None] * len(body)  # the smallest j for every i
+        for u, v in self.nodes_grid.near_pairs():
+            if u > v:
+                u, v = v, u
+            distance = shortest_distance_squared(body[u], body[v])
+            if v < start or u == v or distance >= near:
+                continue
+            if distance < touch and (first[u] is None or v < first[u]):
+                first[u] = v
+            # segment a ends at node a + 1, segment b at node b + 1
+            for a in (u - 1, u):
+                for b in (v - 1, v):
+                    if (
+                        a >= 0
+                        and a + 1 < b < len(body) - 1
+                        and (first[a + 1] is None or b + 1 < first[a + 1])
+                        and segments_cross(*self.segment(a), *self.segment(b))
+                    ):
+                        first[a + 1] = b + 1
+        if start == 0:
+            sweep_start, sweep_step = self.head_sweep()
+            # the first nodes trail along the sweep itself
+            skip = int(sweep_step.length() / Snake.DIST_BETWEEN_NODES) + 2
+            area = sweep_bounds(sweep_start, sweep_step)
+            for j in self.nodes_grid.query_area(*area):
+                for k in (j - 1, j):
+                    if (
+                        k >= skip
+                        and k + 1 < len(body)
+                        and (first[0] is None or k + 1 < first[0])
+                        and segments_cross(sweep_start, sweep_step, *self.segment(k))
+                    ):
+                        first[0] = k + 1
+        for i in range(start, len(body)):
+            if first[i] is not None:
+                return i, first[i]
+        return None
+
     def check_collisions(self):
-        for i in range(len(self.nodes)):
-            for j in range(i + 1, len(self.nodes)):
-                cur = self.nodes[i]
-                other = self.nodes[j]
-                if cur.distance_to(other) < Snake.NODE_R:
-                    self.on_collision(i, j)
-                    break
+        self.fill_nodes_grid()
+        loop = self.find_loop(0)
+        while loop:
+            i, j = loop
+            self.on_collision(i, j)
+            self.fill_nodes_grid()
+            loop = self.find_loop(i + 1)
+        # only this check reads them, don't hold a copy of the body meanwhile
+        self.body = []
+        self.nodes_grid.clear()
 
     def check_fruit_collision(self):
+        sweep_start, sweep_step = self.head_sweep()
         for fruit in FruitsSpawner().fruits:
             if (
-                fruit.transform.pos.distance_to(self.transform.pos)
-                < Fruit.R + Snake.NODE_R
+                segment_point_distance_squared(
+                    sweep_start, sweep_step, fruit.transform.pos
+                )
+                < (Fruit.R + Snake.NODE_R) ** 2
             ):
                 self.on_hit_fruit(fruit)
                 break
@@ -336,7 +559,21 @@ class Snake(Entity):
 
     def update(self, dt: float):
         super().update(dt)
+        if not Snake.FIXED_STEP:
+            self.step(dt)
+
+    def fixed_update(self, fixed_dt):
+        super().fixed_update(fixed_dt)
+        if Snake.FIXED_STEP:
+            self.step(fixed_dt)
+
+    def step(self, dt: float):
+        """
+        Advances the snake by dt, every frame or every fixed step
+        depending on Snake.FIXED_STEP
+        """
         if Snake.pause:
+            self.head_step = Vector2()
             return
         if self.info_display.dash_bar.value < Snake.MAX_DASH_LEVEL_SECS:
             self.info_display.dash_bar.value += dt * Snake.DASH_INC_PER_SEC
@@ -364,34 +601,95 @@ class Snake(Entity):
 
         self.dir.rotate_ip(self.turning_dir * dt * self.speed * 2)
 
-        self.nodes[0] += (
+        self.head_step = (
             self.dir.normalize()
             * self.speed
             * dt
             * (Snake.DASH_MULTIPLIER if self.dash else 1)
             * self.speed_multiplier
         )
-        wrap_ip(self.nodes[0])
-
-        for i in range(1, len(self.nodes)):
-            prev = self.nodes[i - 1]
-            curr = self.nodes[i]
-
-            vec_to_prev = shortest_vector(curr, prev)
-            direction = vec_to_prev.normalize()
-            self.nodes[i] = wrap(prev - direction * Snake.DIST_BETWEEN_NODES)
+        head = self.nodes[0] + self.head_step
+        wrap_ip(head)
+        self.nodes.follow(head, Snake.DIST_BETWEEN_NODES)
+        self.transform.pos = self.nodes[0]
+        self.bounds.inflate(self.head_step.length())
 
         self.check_collisions()
         self.check_fruit_collision()
-        SnakeCollisionManager().check_collisions()
+
+    @staticmethod
+    def get_node_sprite(color: Color, shield: bool) -> Surface:
+        """
+        A node circle (with the shield halo behind it if shield),
+        baked once per color and shield state
+        """
+        key = (tuple(color), shield)
+        if key not in Snake.node_sprites:
+            r = Snake.SHIELD_R
+            sprite = Surface((r * 2, r * 2), pygame.SRCALPHA)
+            if shield:
+                pygame.draw.circle(sprite, ShieldFruit.COLOR, (r, r), r)
+            pygame.draw.circle(sprite, color, (r, r), Snake.NODE_R)
+            Snake.node_sprites[key] = sprite
+        return Snake.node_sprites[key]
+
+    @staticmethod
+    def get_line_strips(nodes: List[Pos]) -> List[List[Pos]]:
+        """
+        Splits the body into polylines that don't cross the screen
+        edges, a segment that wraps ends its strip off screen
+        """
+        strips = []
+        strip = [nodes[0]]
+        for n, nn in pairwise(nodes):
+            if abs(nn[0] - n[0]) <= W / 2 and abs(nn[1] - n[1]) <= H / 2:
+                strip.append(nn)
+            else:
+                strip.append(n + shortest_vector(n, nn))
+                strips.append(strip)
+                strip = [nn]
+        strips.append(strip)
+        return strips
+
+    def interpolated_nodes(self) -> List[Pos]:
+        """
+        The body between the last two fixed steps by
+        GameManager().interpolation, the live nodes if not stepping fixed.
+        Only head_step is kept from the last step: the head is moved
+        back along it, and every other node, which followed its leader
+        along the body, is slid back as far towards the node behind it
+        """
+        back = 1 - GameManager().interpolation
+        if not Snake.FIXED_STEP or not self.head_step or back <= 0:
+            return self.nodes.points()
+        return self.nodes.slide_back(self.head_step * back)
 
     def render(self, sur):
-        for node_pos in self.nodes:
-            if self.shield_timer > 0:
-                pygame.draw.circle(sur, ShieldFruit.COLOR, node_pos, Snake.NODE_R + 2)
-            pygame.draw.circle(sur, self.color, node_pos, Snake.NODE_R)
-        for n, nn in zip(self.nodes, self.nodes[1:]):
-            pygame.draw.line(sur, self.color, n, n + shortest_vector(n, nn))
+        self.render_snapshot(
+            sur, (self.interpolated_nodes(), self.color, self.shield_timer > 0)
+        )
+
+    def snapshot(self):
+        return (
+            tuple(map(tuple, self.interpolated_nodes())),
+            Color(self.color),
+            self.shield_timer > 0,
+        )
+
+    def render_bounds(self):
+        return [
+            points_rect(strip, Snake.SHIELD_R + 1)
+            for strip in Snake.get_line_strips(self.interpolated_nodes())
+        ]
+
+    def render_snapshot(self, sur, data):
+        nodes, color, shield = data
+        sprite = Snake.get_node_sprite(color, shield)
+        ox, oy = Snake.SPRITE_OFFSET
+        sur.fblits([(sprite, (x - ox, y - oy)) for x, y in nodes])
+        for strip in Snake.get_line_strips(nodes):
+            if len(strip) > 1:
+                pygame.draw.lines(sur, color, False, strip)
 
 
 class SnakeAiActions(Enum):
@@ -82,13 +82,14 @@ class Bar(Entity):
         self.z_index = -1
 
     def render(self, sur):
-        pygame.draw.rect(sur, Bar.BGCOLOR, self.transform.rect())
+        self.render_snapshot(sur, self.snapshot())
+
+    def snapshot(self):
         precentage = self.value / self.max_value if self.max_value != 0 else 0
         bar_w = (self.transform.size.w - self.edge_thickness * 2) * precentage
         bar_h = self.transform.size.h - self.edge_thickness * 2
-        pygame.draw.rect(
-            sur,
-            Bar.FCOLOR,
+        return (
+            self.transform.rect(),
             pygame.Rect(
                 self.transform.pos.x + self.edge_thickness,
                 self.transform.pos.y + self.edge_thickness,
@@ -96,7 +97,17 @@ class Bar(Entity):
                 bar_h,
             ),
         )
-        sur.blit(self.text_sur, self.transform.pos + Size(self.edge_thickness))
+
+    def render_snapshot(self, sur, data):
+        rect, fill_rect = data
+        pygame.draw.rect(sur, Bar.BGCOLOR, rect)
+        pygame.draw.rect(sur, Bar.FCOLOR, fill_rect)
+        sur.blit(self.text_sur, Size(rect.topleft) + Size(self.edge_thickness))
+
+    def render_bounds(self):
+        rect = self.transform.rect()
+        text_pos = Size(rect.topleft) + Size(self.edge_thickness)
+        return rect, self.text_sur.get_rect(topleft=text_pos)
 
 
 class Score(Entity):
@@ -143,10 +154,20 @@ class Score(Entity):
             self.scale_animation_timer += dt
 
     def render(self, sur):
-        text_sur = self.text_sur
-        if self.scale != 1:
-            text_sur = pygame.transform.scale_by(text_sur, self.scale)
-        sur.blit(text_sur, self.transform.pos)
+        self.render_snapshot(sur, self.snapshot())
+
+    def snapshot(self):
+        return self.text_sur, self.scale, self.transform.pos.copy()
+
+    def render_snapshot(self, sur, data):
+        text_sur, scale, pos = data
+        if scale != 1:
+            text_sur = pygame.transform.scale_by(text_sur, scale)
+        sur.blit(text_sur, pos)
+
+    def render_bounds(self):
+        size = Size(self.text_sur.get_size()) * self.scale
+        return (pygame.Rect(self.transform.pos, size).inflate(2, 2),)
 
 
 class Slider(Entity):
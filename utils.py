@@ -77,13 +77,81 @@ def wrap_ip(pos: Pos):
 
 
 def shortest_vector(from_pos: pygame.Vector2, to_pos: pygame.Vector2):
-    dx = (to_pos.x - from_pos.x + W / 2) % W - W / 2
-    dy = (to_pos.y - from_pos.y + H / 2) % H - H / 2
+    dx = (to_pos[0] - from_pos[0] + W / 2) % W - W / 2
+    dy = (to_pos[1] - from_pos[1] + H / 2) % H - H / 2
     return pygame.Vector2(dx, dy)
 
 
+def shortest_distance_squared(from_pos: pygame.Vector2, to_pos: pygame.Vector2):
+    dx = (to_pos[0] - from_pos[0] + W / 2) % W - W / 2
+    dy = (to_pos[1] - from_pos[1] + H / 2) % H - H / 2
+    return dx * dx + dy * dy
+
+
+def segment_point_distance_squared(
+    start: pygame.Vector2, step: pygame.Vector2, point: pygame.Vector2
+):
+    """
+    Squared distance from point to the segment start -> start + step,
+    measured the shortest way around the screen edges
+    """
+    rx = (point[0] - start[0] + W / 2) % W - W / 2
+    ry = (point[1] - start[1] + H / 2) % H - H / 2
+    length_squared = step[0] * step[0] + step[1] * step[1]
+    t = 0
+    if length_squared:
+        t = min(max((rx * step[0] + ry * step[1]) / length_squared, 0), 1)
+    dx = rx - step[0] * t
+    dy = ry - step[1] * t
+    return dx * dx + dy * dy
+
+
+def segments_cross(
+    start: pygame.Vector2,
+    step: pygame.Vector2,
+    other_start: pygame.Vector2,
+    other_step: pygame.Vector2,
+):
+    """
+    Whether start -> start + step crosses other_start -> other_start + other_step,
+    measured the shortest way around the screen edges
+    """
+    denom = step[0] * other_step[1] - step[1] * other_step[0]
+    if denom == 0:
+        return False
+    rx = (other_start[0] - start[0] + W / 2) % W - W / 2
+    ry = (other_start[1] - start[1] + H / 2) % H - H / 2
+    t = (rx * other_step[1] - ry * other_step[0]) / denom
+    u = (rx * step[1] - ry * step[0]) / denom
+    return 0 <= t <= 1 and 0 <= u <= 1
+
+
+def sweep_bounds(start: pygame.Vector2, step: pygame.Vector2):
+    end = start + step
+    return (
+        pygame.Vector2(min(start.x, end.x), min(start.y, end.y)),
+        pygame.Vector2(max(start.x, end.x), max(start.y, end.y)),
+    )
+
+
+def points_rect(points, pad: float) -> pygame.Rect:
+    """
+    The bounding rect of points grown by pad on every side
+    """
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    left, top = math.floor(min(xs) - pad), math.floor(min(ys) - pad)
+    right, bottom = math.ceil(max(xs) + pad), math.ceil(max(ys) + pad)
+    return pygame.Rect(left, top, right - left, bottom - top)
+
+
 def draw_border(entity: Entity, sur: pygame.Surface, color: pygame.Color, width=1):
-    rect = entity.transform.rect()
+    draw_rect_border(sur, entity.transform.rect(), color, width)
+
+
+def draw_rect_border(
+    sur: pygame.Surface, rect: pygame.Rect, color: pygame.Color, width=1
+):
     pygame.draw.lines(
         sur,
         color,